@@ -0,0 +1,68 @@
+from ray import *
+from interval import *
+
+class AABB:
+    def __init__(self, x: Interval = None, y: Interval = None, z: Interval = None) -> None:
+        self.x = x if x is not None else Interval()
+        self.y = y if y is not None else Interval()
+        self.z = z if z is not None else Interval()
+
+    @staticmethod
+    def from_points(a: Point3, b: Point3) -> "AABB":
+        """Box spanning the two points, treated as extrema in any order."""
+        return AABB(
+            Interval(min(a.x, b.x), max(a.x, b.x)),
+            Interval(min(a.y, b.y), max(a.y, b.y)),
+            Interval(min(a.z, b.z), max(a.z, b.z)),
+        )
+
+    @staticmethod
+    def surround(box0: "AABB", box1: "AABB") -> "AABB":
+        return AABB(
+            Interval(min(box0.x.min, box1.x.min), max(box0.x.max, box1.x.max)),
+            Interval(min(box0.y.min, box1.y.min), max(box0.y.max, box1.y.max)),
+            Interval(min(box0.z.min, box1.z.min), max(box0.z.max, box1.z.max)),
+        )
+
+    def axis_interval(self, n: int) -> Interval:
+        if n == 1: return self.y
+        if n == 2: return self.z
+        return self.x
+
+    @property
+    def is_empty(self) -> bool:
+        return self.x.size < 0 or self.y.size < 0 or self.z.size < 0
+
+    @property
+    def surface_area(self) -> float:
+        if self.is_empty: return 0.0
+        dx, dy, dz = self.x.size, self.y.size, self.z.size
+        return 2 * (dx*dy + dy*dz + dz*dx)
+
+    def centroid(self) -> Point3:
+        return Point3((self.x.min + self.x.max) / 2, (self.y.min + self.y.max) / 2, (self.z.min + self.z.max) / 2)
+
+    def longest_axis(self) -> int:
+        sizes = (self.x.size, self.y.size, self.z.size)
+        return sizes.index(max(sizes))
+
+    def hit(self, r: Ray, ray_t: Interval) -> bool:
+        t_min, t_max = ray_t.min, ray_t.max
+        for axis in range(3):
+            ax = self.axis_interval(axis)
+            d = r.dir[axis]
+            adinv = 1.0 / d if d else 1e30
+
+            t0 = (ax.min - r.orig[axis]) * adinv
+            t1 = (ax.max - r.orig[axis]) * adinv
+            if t0 > t1: t0, t1 = t1, t0
+
+            if t0 > t_min: t_min = t0
+            if t1 < t_max: t_max = t1
+            if t_max <= t_min: return False
+        return True
+
+    def __repr__(self) -> str:
+        return f"AABB(({self.x.min}, {self.y.min}, {self.z.min}), ({self.x.max}, {self.y.max}, {self.z.max}))"
+
+empty_box = AABB()
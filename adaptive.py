@@ -0,0 +1,113 @@
+import numpy as np
+
+from camera import *
+
+def _luminance(c: Color) -> float:
+    return 0.2126 * c.x + 0.7152 * c.y + 0.0722 * c.z
+
+class AdaptiveResult:
+    def __init__(self, linear: np.ndarray, spp_map: np.ndarray, error: np.ndarray, threshold: float) -> None:
+        self.linear = linear
+        self.spp_map = spp_map
+        self.error = error
+        self.threshold = threshold
+
+    @property
+    def average_spp(self) -> float:
+        return float(self.spp_map.mean())
+
+    @property
+    def total_samples(self) -> int:
+        return int(self.spp_map.sum())
+
+    @property
+    def converged_fraction(self) -> float:
+        return float((self.error <= self.threshold).mean())
+
+    def spp_map_image(self) -> np.ndarray:
+        """Sample-count map scaled to a uint8 grayscale image."""
+        peak = max(int(self.spp_map.max()), 1)
+        return (255 * self.spp_map / peak).astype(np.uint8)
+
+class AdaptiveRender:
+    """
+    Per-pixel adaptive sampling. Every pixel gets `min_spp` samples, then the
+    remaining budget of `cam.samples_per_pixel` samples per pixel (on average)
+    goes to the pixels with the widest confidence interval on their luminance,
+    until each is below `threshold` (relative to the pixel mean) or has `max_spp`.
+    `min_spp` is capped at the budget, but a variance needs at least 2 samples.
+    """
+
+    Z = 1.96
+
+    def __init__(self, cam: Camera, world: Hittable, threshold: float = 0.05,
+                 min_spp: int = 8, max_spp: int = None, step: int = 4) -> None:
+        cam.initialize(world)
+        self.cam = cam
+        self.world = world
+        self.threshold = threshold
+        self.min_spp = max(2, min(min_spp, cam.samples_per_pixel))
+        self.max_spp = max_spp if max_spp is not None else 4 * cam.samples_per_pixel
+        self.step = max(1, step)
+
+        shape = (cam.image_height, cam.image_width)
+        self.sum = np.zeros(shape + (3,))
+        self.n = np.zeros(shape, dtype=np.int64)
+        self.mean = np.zeros(shape)
+        self.m2 = np.zeros(shape)
+
+    def __add_samples(self, u: int, v: int, count: int) -> None:
+        # Welford's online mean/variance of the pixel luminance.
+        cam, world = self.cam, self.world
+        total = Color(0, 0, 0)
+        n, mean, m2 = int(self.n[v, u]), float(self.mean[v, u]), float(self.m2[v, u])
+        for _ in range(count):
+            c = cam.sample(u, v, world, n)
+            total += c
+            n += 1
+            l = _luminance(c)
+            delta = l - mean
+            mean += delta / n
+            m2 += delta * (l - mean)
+        self.sum[v, u] += tuple(total)
+        self.n[v, u], self.mean[v, u], self.m2[v, u] = n, mean, m2
+
+    def error(self) -> np.ndarray:
+        """Confidence interval half-width of each pixel relative to its mean luminance."""
+        n = np.maximum(self.n, 2)
+        var = self.m2 / (n - 1)
+        return self.Z * np.sqrt(var / n) / np.maximum(self.mean, 1e-3)
+
+    def run(self) -> AdaptiveResult:
+        cam = self.cam
+        height, width = cam.image_height, cam.image_width
+        budget = cam.samples_per_pixel * height * width
+        pbar = progress_bar(budget, cam.progress)
+
+        for v in range(height):
+            for u in range(width):
+                self.__add_samples(u, v, self.min_spp)
+        spent = self.min_spp * height * width
+        pbar.update(min(spent, budget))
+
+        while spent < budget:
+            error = self.error()
+            active = (error > self.threshold) & (self.n < self.max_spp)
+            if not active.any():
+                break
+
+            # Noisiest pixels first, so a running-out budget is spent where it matters most.
+            order = np.argsort(-error[active], kind='stable')
+            vs, us = np.nonzero(active)
+            for i in order:
+                v, u = int(vs[i]), int(us[i])
+                count = min(self.step, self.max_spp - int(self.n[v, u]), budget - spent)
+                if count <= 0:
+                    break
+                self.__add_samples(u, v, count)
+                spent += count
+                pbar.update(count)
+        pbar.close()
+
+        linear = self.sum / np.maximum(self.n, 1)[..., None]
+        return AdaptiveResult(linear, self.n.copy(), self.error(), self.threshold)
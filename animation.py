@@ -0,0 +1,161 @@
+import bisect
+import multiprocessing as mp
+import os
+from typing import Dict, List, Tuple
+
+from camera import *
+from compiled_scene import *
+from framebuffer import open_writer
+
+CAMERA_TRACK_FIELDS = ("lookfrom", "lookat", "vfov", "focus_dist", "defocus_angle")
+
+class Track:
+    """Piecewise-linear curve through `(time, value)` keys; values are floats or `Vec3`s."""
+
+    def __init__(self, keys=()) -> None:
+        self.times: List[float] = []
+        self.values: list = []
+        for time, value in keys:
+            self.add(time, value)
+
+    def add(self, time: float, value) -> None:
+        i = bisect.bisect_right(self.times, time)
+        self.times.insert(i, time)
+        self.values.insert(i, value)
+
+    def at(self, time: float):
+        """Value at `time`, held constant before the first key and after the last."""
+
+        i = bisect.bisect_right(self.times, time)
+        if i == 0:
+            return self.values[0]
+        if i == len(self.times):
+            return self.values[-1]
+        t0, t1 = self.times[i-1], self.times[i]
+        a = (time - t0) / (t1 - t0)
+        return self.values[i-1] * (1 - a) + self.values[i] * a
+
+    @property
+    def end(self) -> float:
+        return self.times[-1] if self.times else 0.0
+
+class Animation:
+    """
+    Camera fly-through with optionally moving spheres, rendered frame by frame
+    from one scene. The world is compiled or put in a BVH once; moving spheres
+    only refit that structure's bounds between frames.
+
+        anim = Animation(cam, world, fps=24)
+        anim.key(0.0, lookfrom=Point3(13,2,3))
+        anim.key(2.0, lookfrom=Point3(3,2,13), vfov=30)
+        anim.move(sphere, [(0.0, Point3(4,1,0)), (2.0, Point3(4,3,0))])
+        for index, path in anim.render("frames/frame_{:04d}.png"):
+            ...
+    """
+
+    def __init__(self, cam: Camera, world: Hittable, fps: float = 24.0) -> None:
+        self.cam = cam
+        self.fps = fps
+        self.camera_tracks: Dict[str, Track] = {}
+        self.motion: List[Tuple[object, Track]] = []
+
+        # The array backends get a compiled scene with a flattened BVH, the Python one an object BVH.
+        if cam.backend in ("numpy", "numba") or isinstance(world, CompiledScene):
+            if isinstance(world, CompiledScene):
+                self.__spheres = {}
+            else:
+                self.__spheres = {id(s): i for i, s in enumerate(flatten_spheres(world, []))}
+                world = CompiledScene(world)
+            self.world = world
+            if self.world.bvh_nodes is None:
+                self.world.build_bvh()
+        else:
+            self.world = world if isinstance(world, BVH) else BVH(world)
+
+    def key(self, time: float, **params) -> None:
+        """Adds a camera keyframe; `params` are any of `CAMERA_TRACK_FIELDS`."""
+
+        for name, value in params.items():
+            if name not in CAMERA_TRACK_FIELDS:
+                raise ValueError(f"cannot animate camera field '{name}', expected one of {', '.join(CAMERA_TRACK_FIELDS)}")
+            self.camera_tracks.setdefault(name, Track()).add(time, value)
+
+    def move(self, sphere, keys: List[Tuple[float, Point3]]) -> None:
+        """
+        Moves `sphere` along `(time, center)` keys. For a compiled world, `sphere`
+        is either one of the `Sphere`s it was compiled from or its index.
+        """
+
+        if isinstance(self.world, CompiledScene) and not isinstance(sphere, int):
+            if id(sphere) not in self.__spheres:
+                raise ValueError("sphere is not part of the animated world")
+            sphere = self.__spheres[id(sphere)]
+        self.motion.append((sphere, Track(keys)))
+
+    @property
+    def duration(self) -> float:
+        return max([t.end for t in self.camera_tracks.values()] + [t.end for _, t in self.motion] + [0.0])
+
+    @property
+    def frame_count(self) -> int:
+        return int(round(self.duration * self.fps)) + 1
+
+    def apply(self, time: float) -> None:
+        """Poses the camera and the moving spheres at `time`."""
+
+        for name, track in self.camera_tracks.items():
+            setattr(self.cam, name, track.at(time))
+
+        if not self.motion:
+            return
+        if isinstance(self.world, CompiledScene):
+            indices = [i for i, _ in self.motion]
+            centers = [tuple(track.at(time)) for _, track in self.motion]
+            self.world.move_spheres(indices, centers)
+        else:
+            for sphere, track in self.motion:
+                sphere.move_to(track.at(time))
+            self.world.refit()
+
+    def render_frame(self, index: int, path: str) -> str:
+        """Renders frame `index` straight into the image file `path`."""
+
+        self.apply(index / self.fps)
+        cam = self.cam
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open_writer(path, cam.image_width, cam.image_height) as writer:
+            cam.render(self.world, writer)
+        return path
+
+    def render(self, pattern: str, frames: int = None, workers: int = 1):
+        """
+        Renders frames 0 .. `frames` - 1 (all of them by default) to `pattern.format(index)`,
+        a .png or .ppm path, and yields `(index, path)` as each frame is written.
+        With `workers` > 1, whole frames are rendered in parallel on a process
+        pool that receives the scene once.
+        """
+
+        frames = self.frame_count if frames is None else frames
+        if workers <= 1:
+            for index in range(frames):
+                yield index, self.render_frame(index, pattern.format(index))
+            return
+
+        with mp.Pool(workers, initializer=_init_worker, initargs=(self, pattern)) as pool:
+            yield from pool.imap_unordered(_render_frame, range(frames))
+
+# Per-process animation state, set once per worker by `_init_worker`.
+_animation: Animation = None
+_pattern: str = None
+
+def _init_worker(animation: Animation, pattern: str) -> None:
+    global _animation, _pattern
+    _animation = animation
+    _pattern = pattern
+    # Frames are already spread over processes; pool workers cannot start pools of their own.
+    _animation.cam.workers = 1
+
+def _render_frame(index: int) -> Tuple[int, str]:
+    return index, _animation.render_frame(index, _pattern.format(index))
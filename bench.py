@@ -0,0 +1,223 @@
+"""
+Reproducible benchmarks of the renderer's hot paths.
+
+    python bench.py --out bench.json
+    python bench.py --compare bench.json
+"""
+
+import argparse
+import contextlib
+import itertools
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+
+from scenes import *
+from bvh import *
+
+SEED = 1234
+
+class Result:
+    """A measured value; `informational` ones are reported but never compared against a baseline."""
+
+    def __init__(self, name: str, value: float, unit: str, higher_is_better: bool, informational: bool = False) -> None:
+        self.name = name
+        self.value = value
+        self.unit = unit
+        self.higher_is_better = higher_is_better
+        self.informational = informational
+
+    def as_dict(self) -> dict:
+        d = {"value": self.value, "unit": self.unit, "higher_is_better": self.higher_is_better}
+        if self.informational:
+            d["informational"] = True
+        return d
+
+def _micro(name: str, stmt, number: int, repeat: int = 5) -> Result:
+    """Best-of-`repeat` time per call of `stmt`, in nanoseconds."""
+    best = min(timeit.repeat(stmt, number=number, repeat=repeat))
+    return Result(name, best / number * 1e9, "ns/op", False)
+
+def bench_render(name: str, world: Hittable, image_width: int, samples_per_pixel: int, max_depth: int):
+    cam = final_camera(image_width, samples_per_pixel, max_depth)
+    target = []
+    random.seed(SEED)
+
+    start = time.perf_counter()
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stderr(devnull):
+        cam.render(world, target)
+    wall = time.perf_counter() - start
+
+    rays = sum(segments * count for segments, count in enumerate(cam.depth_histogram))
+    samples = cam.image_width * cam.image_height * cam.samples_per_pixel
+    return [
+        Result(f"render.{name}.wall_time", wall, "s", False),
+        Result(f"render.{name}.rays_per_sec", rays / wall, "rays/s", True),
+        Result(f"render.{name}.samples_per_sec", samples / wall, "samples/s", True),
+    ]
+
+def bench_micro(number: int):
+    world = final_scene(SEED)
+    rng = random.Random(SEED)
+    rays = [Ray(Point3(13, 2, 3), Point3(rng.uniform(-4, 4), rng.uniform(-1, 2), rng.uniform(-4, 4)) - Point3(13, 2, 3))
+            for _ in range(64)]
+    ray_t = Interval(0.001, math.inf)
+
+    sphere = world.objects[-3]
+    rec = sphere.hit(Ray(Point3(13, 2, 3), sphere.center - Point3(13, 2, 3)), ray_t)
+
+    results = []
+    it = itertools.cycle(rays)
+    results.append(_micro("micro.sphere_hit", lambda: sphere.hit(next(it), ray_t), number * 10))
+    results.append(_micro("micro.hittable_list_hit", lambda: world.hit(next(it), ray_t), max(1, number // 10)))
+
+    r_in = Ray(Point3(0, 1, 3), Vec3(0, 0, -1))
+    for mat in (Lambertian(Color(0.5, 0.5, 0.5)), Metal(Color(0.7, 0.6, 0.5), 0.3), Dielectric(1.5)):
+        results.append(_micro(f"micro.{type(mat).__name__.lower()}_scatter", lambda: mat.scatter(r_in, rec), number))
+
+    a, b = Vec3(1.0, 2.0, 3.0), Vec3(-0.5, 0.25, 4.0)
+    results.append(_micro("micro.vec3_add", lambda: a + b, number * 10))
+    results.append(_micro("micro.vec3_mul_scalar", lambda: a * 0.5, number * 10))
+    results.append(_micro("micro.vec3_dot", lambda: a.dot(b), number * 10))
+    results.append(_micro("micro.vec3_cross", lambda: a.cross(b), number * 10))
+    results.append(_micro("micro.vec3_normalize", lambda: a.normalize(), number * 10))
+    return results
+
+def bench_queues(image_width: int, samples_per_pixel: int, max_depth: int):
+    """
+    Shading-queue occupancy of the NumPy backend on the `main.py` scene: the
+    share of hits each material queue takes, and the mean run of consecutive
+    hits shaded by the same code before (ray order) and after queueing.
+    """
+
+    from compiled_scene import CompiledScene
+    from wavefront import QueueStats
+
+    world = CompiledScene(final_scene(SEED))
+    world.build_bvh()
+    cam = final_camera(image_width, samples_per_pixel, max_depth)
+    cam.backend = "numpy"
+    cam.seed = SEED
+    cam.progress = False
+    cam.queue_stats = QueueStats()
+    cam.render(world, [])
+
+    stats = cam.queue_stats.as_dict()
+    # The material mix is a property of the scene, not a performance figure.
+    results = [Result(f"queues.final.{name}_occupancy", q["occupancy"], "fraction", False, informational=True)
+               for name, q in stats["queues"].items()]
+    results.append(Result("queues.final.mean_run_unsorted", stats["mean_run_unsorted"], "hits", True, informational=True))
+    results.append(Result("queues.final.mean_run_sorted", stats["mean_run_sorted"], "hits", True))
+    return results
+
+def bench_startup(repeat: int = 5):
+    """
+    Headless CLI runs of two tiny jobs in one process: best wall time of the whole
+    run (interpreter start included), the CLI's own startup, and the first (cold)
+    and second (warm scene) job.
+    """
+
+    cli = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cli.py")
+    with tempfile.TemporaryDirectory() as tmp:
+        jobs_path = os.path.join(tmp, "jobs.json")
+        report_path = os.path.join(tmp, "report.json")
+        with open(jobs_path, "w") as f:
+            json.dump([{"out": os.path.join(tmp, "a.ppm")}, {"out": os.path.join(tmp, "b.ppm")}], f)
+        command = [sys.executable, cli, "--scene", "final", "--width", "8", "--spp", "1", "--depth", "2",
+                   "--seed", str(SEED), "--jobs", jobs_path, "--report", report_path]
+
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            subprocess.run(command, check=True, stderr=subprocess.DEVNULL)
+            wall = time.perf_counter() - start
+            if best is None or wall < best[0]:
+                with open(report_path) as f:
+                    best = (wall, json.load(f))
+
+    wall, report = best
+    cold, warm = report["jobs"]
+    return [
+        Result("startup.cli_wall_time", wall, "s", False),
+        Result("startup.cli_startup", report["startup_seconds"], "s", False),
+        Result("startup.cli_cold_job", cold["build_seconds"] + cold["render_seconds"], "s", False),
+        Result("startup.cli_warm_job", warm["build_seconds"] + warm["render_seconds"], "s", False),
+    ]
+
+def run(quick: bool = False):
+    width, spp, depth, number = (20, 2, 10, 2000) if quick else (40, 4, 10, 10000)
+
+    results = []
+    results += bench_render("final", BVH(final_scene(SEED)), width, spp, depth)
+    results += bench_render("few_spheres", few_spheres_scene(), width, spp, depth)
+
+    scaled = scaled_scene(10000, SEED)
+    bvh = BVH(scaled)
+    results.append(Result("build.scaled_10k.bvh_build_time", bvh.stats.build_time, "s", False))
+    results += bench_render("scaled_10k", bvh, width, spp, depth)
+
+    results += bench_queues(width, spp, depth)
+    results += bench_micro(number)
+    results += bench_startup(3 if quick else 5)
+    return results
+
+def report(results) -> dict:
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "implementation": platform.python_implementation(),
+            "machine": platform.machine(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "results": {r.name: r.as_dict() for r in results},
+    }
+
+def compare(current: dict, baseline: dict, tolerance: float):
+    """Returns (name, baseline, current, relative change) of every result worse than `tolerance`."""
+
+    regressions = []
+    for name, base in baseline["results"].items():
+        cur = current["results"].get(name)
+        if cur is None or base["value"] == 0 or base.get("informational") or cur.get("informational"):
+            continue
+        change = (cur["value"] - base["value"]) / base["value"]
+        worse = -change if base["higher_is_better"] else change
+        if worse > tolerance:
+            regressions.append((name, base["value"], cur["value"], change))
+    return regressions
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--out", help="write results as JSON to this path")
+    parser.add_argument("--compare", metavar="BASELINE", help="compare against a stored JSON baseline")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="allowed relative slowdown (default: 0.15)")
+    parser.add_argument("--quick", action="store_true", help="smaller workloads for a fast smoke run")
+    args = parser.parse_args(argv)
+
+    current = report(run(args.quick))
+    for name, r in current["results"].items():
+        print(f"{name:45s} {r['value']:>14.4g} {r['unit']}")
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(current, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(current, baseline, args.tolerance)
+        for name, base, cur, change in regressions:
+            print(f"REGRESSION {name}: {base:.4g} -> {cur:.4g} ({change:+.1%})")
+        if regressions:
+            return 1
+        print(f"no regressions beyond {args.tolerance:.0%}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
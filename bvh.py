@@ -0,0 +1,277 @@
+import time
+from typing import List, Tuple
+
+from hittable_list import *
+
+class BVHStats:
+    """Build and traversal counters of a `BVH`."""
+
+    def __init__(self) -> None:
+        self.object_count = 0
+        self.node_count = 0
+        self.leaf_count = 0
+        self.max_depth = 0
+        self.build_time = 0.0
+
+        self.rays = 0
+        self.nodes_visited = 0
+        self.primitive_tests = 0
+
+    def reset_traversal(self) -> None:
+        self.rays = 0
+        self.nodes_visited = 0
+        self.primitive_tests = 0
+
+    @property
+    def nodes_per_ray(self) -> float:
+        return self.nodes_visited / self.rays if self.rays else 0.0
+
+    @property
+    def tests_per_ray(self) -> float:
+        return self.primitive_tests / self.rays if self.rays else 0.0
+
+    def as_dict(self) -> dict:
+        return {
+            "object_count": self.object_count,
+            "node_count": self.node_count,
+            "leaf_count": self.leaf_count,
+            "max_depth": self.max_depth,
+            "build_time": self.build_time,
+            "rays": self.rays,
+            "nodes_visited": self.nodes_visited,
+            "primitive_tests": self.primitive_tests,
+            "nodes_per_ray": self.nodes_per_ray,
+            "tests_per_ray": self.tests_per_ray,
+        }
+
+class BVHNode:
+    __slots__ = 'bbox', 'bounds', 'axis', 'left', 'right', 'objects'
+
+    def __init__(self, bbox: AABB) -> None:
+        self.set_bbox(bbox)
+        self.axis = 0
+        self.left: BVHNode = None
+        self.right: BVHNode = None
+        self.objects: List[Hittable] = None
+
+    def set_bbox(self, bbox: AABB) -> None:
+        self.bbox = bbox
+        # Flattened (xmin, xmax, ymin, ymax, zmin, zmax) for the slab test in `BVH.closest`.
+        self.bounds = (bbox.x.min, bbox.x.max, bbox.y.min, bbox.y.max, bbox.z.min, bbox.z.max)
+
+class BVH(Hittable):
+    """
+    Bounding volume hierarchy over a set of hittables, built with a binned
+    surface area heuristic. Can be used anywhere a `HittableList` is.
+    """
+
+    SAH_BINS = 12
+    TRAVERSAL_COST = 1.0
+    INTERSECTION_COST = 1.0
+
+    def __init__(self, objects, max_leaf_size: int = 4) -> None:
+        super().__init__()
+        if isinstance(objects, HittableList):
+            objects = objects.objects
+
+        self.max_leaf_size = max(1, max_leaf_size)
+        self.stats = BVHStats()
+
+        start = time.perf_counter()
+        items = [(obj, obj.bounding_box()) for obj in objects]
+        items = [(obj, box, box.centroid()) for obj, box in items]
+        self.root = self.__build(items, 1) if items else None
+        self.stats.build_time = time.perf_counter() - start
+        self.stats.object_count = len(items)
+
+    def bounding_box(self) -> AABB:
+        return self.root.bbox if self.root else AABB()
+
+    def refit(self) -> None:
+        """
+        Recomputes every node's box bottom-up after objects moved, keeping the tree
+        structure. Much cheaper than a rebuild, though boxes loosen as objects drift
+        far from where they were when the tree was built.
+        """
+
+        order = []
+        stack = [self.root] if self.root else []
+        while stack:
+            node = stack.pop()
+            order.append(node)
+            if node.objects is None:
+                stack.append(node.left)
+                stack.append(node.right)
+
+        # Children always come after their parent in `order`.
+        for node in reversed(order):
+            if node.objects is not None:
+                for obj in node.objects:
+                    if isinstance(obj, BVH):
+                        obj.refit()
+                boxes = [obj.bounding_box() for obj in node.objects]
+            else:
+                boxes = [node.left.bbox, node.right.bbox]
+            bbox = boxes[0]
+            for box in boxes[1:]:
+                bbox = AABB.surround(bbox, box)
+            node.set_bbox(bbox)
+
+    def __build(self, items: list, depth: int) -> BVHNode:
+        stats = self.stats
+        stats.node_count += 1
+        stats.max_depth = max(stats.max_depth, depth)
+
+        bbox = items[0][1]
+        for _, box, _ in items[1:]:
+            bbox = AABB.surround(bbox, box)
+        node = BVHNode(bbox)
+
+        split = self.__find_split(items, bbox) if len(items) > self.max_leaf_size else None
+        if split is None:
+            node.objects = [obj for obj, _, _ in items]
+            stats.leaf_count += 1
+            return node
+
+        node.axis, left, right = split
+        node.left = self.__build(left, depth + 1)
+        node.right = self.__build(right, depth + 1)
+        return node
+
+    def __find_split(self, items: list, bbox: AABB):
+        """Returns the SAH-cheapest (axis, left, right) partition, or None if a leaf is cheaper."""
+
+        n = len(items)
+        parent_area = bbox.surface_area
+        best_cost = self.INTERSECTION_COST * n
+        best = None
+
+        for axis in range(3):
+            cmin = min(c[axis] for _, _, c in items)
+            cmax = max(c[axis] for _, _, c in items)
+            extent = cmax - cmin
+            if extent <= 0:
+                continue
+
+            bins = self.SAH_BINS
+            counts = [0] * bins
+            boxes = [None] * bins
+            for _, box, c in items:
+                b = min(bins - 1, int(bins * (c[axis] - cmin) / extent))
+                counts[b] += 1
+                boxes[b] = box if boxes[b] is None else AABB.surround(boxes[b], box)
+
+            # Sweep from the right to get the area and count of every right-hand side.
+            right_area = [0.0] * bins
+            right_count = [0] * bins
+            acc_box, acc_count = None, 0
+            for b in range(bins - 1, 0, -1):
+                if boxes[b] is not None:
+                    acc_box = boxes[b] if acc_box is None else AABB.surround(acc_box, boxes[b])
+                acc_count += counts[b]
+                right_area[b] = acc_box.surface_area if acc_box else 0.0
+                right_count[b] = acc_count
+
+            acc_box, acc_count = None, 0
+            for b in range(1, bins):
+                if boxes[b-1] is not None:
+                    acc_box = boxes[b-1] if acc_box is None else AABB.surround(acc_box, boxes[b-1])
+                acc_count += counts[b-1]
+                if acc_count == 0 or right_count[b] == 0:
+                    continue
+
+                if parent_area <= 0:
+                    continue
+
+                left_area = acc_box.surface_area
+                cost = self.TRAVERSAL_COST + self.INTERSECTION_COST * (
+                    left_area * acc_count + right_area[b] * right_count[b]
+                ) / parent_area
+                if cost < best_cost:
+                    best_cost = cost
+                    best = (axis, cmin + extent * b / bins)
+
+        if best is None:
+            # Degenerate sets (e.g. coincident centroids) that still exceed the leaf size.
+            if n <= self.max_leaf_size * 4:
+                return None
+            axis = bbox.longest_axis()
+            items = sorted(items, key=lambda item: item[2][axis])
+            return axis, items[:n//2], items[n//2:]
+
+        axis, pos = best
+        left = [item for item in items if item[2][axis] < pos]
+        right = [item for item in items if item[2][axis] >= pos]
+        return axis, left, right
+
+    def closest(self, r: Ray, t_min: float, t_max: float) -> Tuple[float, Hittable]:
+        return self.__search(r, t_min, t_max, False)
+
+    def occluded(self, r: Ray, t_min: float, t_max: float) -> bool:
+        return self.__search(r, t_min, t_max, True) is not None
+
+    def __search(self, r: Ray, t_lo: float, closest: float, any_hit: bool) -> Tuple[float, Hittable]:
+        """Nearest `(t, object)` hit, or with `any_hit` the first one found; None on a miss."""
+
+        stats = self.stats
+        stats.rays += 1
+        if self.root is None:
+            return None
+
+        ox, oy, oz = r.orig.x, r.orig.y, r.orig.z
+        dx, dy, dz = r.dir.x, r.dir.y, r.dir.z
+        ix = 1.0 / dx if dx else 1e30
+        iy = 1.0 / dy if dy else 1e30
+        iz = 1.0 / dz if dz else 1e30
+
+        best = None
+        visited = 0
+        tests = 0
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            visited += 1
+
+            xmin, xmax, ymin, ymax, zmin, zmax = node.bounds
+            t0 = (xmin - ox) * ix; t1 = (xmax - ox) * ix
+            if t0 > t1: t0, t1 = t1, t0
+            lo = t0 if t0 > t_lo else t_lo
+            hi = t1 if t1 < closest else closest
+            if hi <= lo: continue
+            t0 = (ymin - oy) * iy; t1 = (ymax - oy) * iy
+            if t0 > t1: t0, t1 = t1, t0
+            if t0 > lo: lo = t0
+            if t1 < hi: hi = t1
+            if hi <= lo: continue
+            t0 = (zmin - oz) * iz; t1 = (zmax - oz) * iz
+            if t0 > t1: t0, t1 = t1, t0
+            if t0 > lo: lo = t0
+            if t1 < hi: hi = t1
+            if hi <= lo: continue
+
+            if node.objects is not None:
+                for obj in node.objects:
+                    tests += 1
+                    if obj.primitive:
+                        t = obj.distance(r, t_lo, closest)
+                        if t < closest:
+                            best = obj
+                            closest = t
+                    elif found := obj.closest(r, t_lo, closest):
+                        closest, best = found
+                if any_hit and best is not None:
+                    break
+                continue
+
+            # Left holds the lower centroids along the split axis; visit the near child
+            # first so `closest` shrinks early.
+            if (dx, dy, dz)[node.axis] < 0:
+                stack.append(node.left)
+                stack.append(node.right)
+            else:
+                stack.append(node.right)
+                stack.append(node.left)
+
+        stats.nodes_visited += visited
+        stats.primitive_tests += tests
+        return None if best is None else (closest, best)
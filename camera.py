@@ -1,14 +1,23 @@
 import random
-from tqdm import tqdm
+import warnings
+from typing import TYPE_CHECKING, List
 
 from hittable import *
 from interval import *
+from sampler import *
+
+if TYPE_CHECKING:
+    from instrument import RenderStats
+    from denoise import AOVBuffers
+    from hitcache import PrimaryHitCache
+    from primary import PrimaryRays
+    from wavefront import QueueStats
 
 def _linear_to_gamma(linear_component: float) -> float:
     if linear_component > 0: return math.sqrt(linear_component)
     else: return 0
 
-def _write_color(target: list, c: Color) -> None:
+def color_to_rgb(c: Color) -> List[int]:
     r = _linear_to_gamma(c.x)
     g = _linear_to_gamma(c.y)
     b = _linear_to_gamma(c.z)
@@ -17,7 +26,38 @@ def _write_color(target: list, c: Color) -> None:
     r = int(256 * intensity.clamp(r))
     g = int(256 * intensity.clamp(g))
     b = int(256 * intensity.clamp(b))
-    target.extend([r, g, b])
+    return [r, g, b]
+
+def sky_color(r: Ray) -> Color:
+    unit_direction = r.dir.normalize()
+    a = (unit_direction.y + 1.0) * 0.5
+    return Color(1.0, 1.0, 1.0) * (1.0-a) + Color(0.5, 0.7, 1.0) * a
+
+class _NoProgress:
+    def update(self, n: int = 1) -> None:
+        pass
+    
+    def close(self) -> None:
+        pass
+
+def progress_bar(total: int, enabled: bool = True):
+    """tqdm bar counting to `total`; tqdm is only imported when the bar is shown."""
+    
+    if not enabled:
+        return _NoProgress()
+    from tqdm import tqdm
+    return tqdm(total=total)
+
+def write_row(target, v: int, row: List[int]) -> None:
+    """
+    Hands one finished scanline of RGB bytes to `target`: a list is extended,
+    anything else (e.g. a `framebuffer.Framebuffer` or streaming writer) gets `write_row`.
+    """
+    
+    if isinstance(target, list):
+        target.extend(row)
+    else:
+        target.write_row(v, row)
 
 class Camera:
     def __init__(
@@ -30,6 +70,7 @@ class Camera:
     ) -> None:
         self.aspect_ratio = aspect_ratio
         self.image_width = image_width
+        self.fixed_height: int = None
         self.samples_per_pixel = samples_per_pixel
         self.max_depth = max_depth
         self.vfov = vfov
@@ -41,6 +82,21 @@ class Camera:
         self.defocus_angle: float = 0.0
         self.focus_dist: float = 10.0
         
+        self.rr_min_depth: int = None
+        self.primary_culling: bool = True
+        self.sampler: Sampler = None
+        self.depth_histogram: List[int] = []
+        self.stats: RenderStats = None
+        self.aovs: AOVBuffers = None
+        self.hit_cache: PrimaryHitCache = None
+        self.queue_stats: QueueStats = None
+        
+        self.progress: bool = True
+        self.backend: str = "python"
+        self.workers: int = 1
+        self.seed: int = None
+        self.tile_size: int = 16
+        
         self.__image_height: int
         self.__center: Point3
         self.__pixel00_loc: Point3
@@ -49,24 +105,199 @@ class Camera:
         
         self.__defocus_disk_u: Vec3
         self.__defocus_disk_v: Vec3
+        
+        self.__primary: PrimaryRays = None
+        self.__sampler: Sampler = None
     
-    def render(self, world:Hittable, target:list) -> None:
-        self.__initialize()
-        pbar = tqdm(total=self.__image_height*self.image_width)
+    @property
+    def image_height(self) -> int:
+        """`fixed_height` when set, else `image_width / aspect_ratio` rounded down."""
+        if self.fixed_height is not None:
+            return self.fixed_height
+        return int(self.image_width / self.aspect_ratio)
+    
+    @property
+    def render_sampler(self) -> Sampler:
+        """Sampler of the current frame, built by `initialize` from `sampler`."""
+        return self.__sampler
+    
+    @property
+    def center(self) -> Point3:
+        return self.__center
+    
+    @property
+    def pixel00_loc(self) -> Point3:
+        return self.__pixel00_loc
+    
+    @property
+    def pixel_delta_u(self) -> Vec3:
+        return self.__pixel_delta_u
+    
+    @property
+    def pixel_delta_v(self) -> Vec3:
+        return self.__pixel_delta_v
+    
+    @property
+    def defocus_disk_u(self) -> Vec3:
+        return self.__defocus_disk_u
+    
+    @property
+    def defocus_disk_v(self) -> Vec3:
+        return self.__defocus_disk_v
+    
+    def render(self, world:Hittable, target) -> None:
+        if self.hit_cache is not None:
+            if self.stats is not None or self.backend != "python" or self.workers > 1:
+                raise ValueError("the primary-hit cache is only used by the in-process Python path")
+            self.hit_cache.validate(self, world)
+        
+        if self.aovs is not None and (self.backend == "numba" or self.workers > 1):
+            raise ValueError("AOVs are only recorded by the in-process Python and NumPy paths")
+        if self.queue_stats is not None and self.backend != "numpy":
+            raise ValueError("shading queues are only used by the NumPy backend")
+        if self.stats is not None and (self.backend != "python" or self.workers > 1):
+            raise ValueError("render stats are only collected by the in-process Python path")
+        if self.stats is not None and self.aovs is not None:
+            raise ValueError("AOVs are not recorded by instrumented renders")
+        
+        if self.stats is not None:
+            from instrument import render_instrumented
+            render_instrumented(self, world, target, self.stats)
+            return
+        
+        if self.backend == "numpy":
+            import wavefront
+            wavefront.render(self, world, target, seed=self.seed)
+            return
+        if self.backend == "numba":
+            import jit_backend
+            if jit_backend.available():
+                jit_backend.render(self, world, target)
+                return
+            warnings.warn("numba is not installed, rendering with the Python backend")
+        elif self.backend != "python":
+            raise ValueError(f"unknown backend '{self.backend}', expected 'python', 'numpy' or 'numba'")
+        
+        if self.workers > 1 or self.seed is not None:
+            from parallel import render_tiles
+            render_tiles(self, world, target)
+            return
+        
+        self.initialize(world)
+        pbar = progress_bar(self.__image_height*self.image_width, self.progress)
         
         for v in range(self.__image_height):
+            row = []
             for u in range(self.image_width):
-                pixel_color = Color(0, 0, 0)
-                for _ in range(self.samples_per_pixel):
-                    r = self.__get_ray(u, v)
-                    pixel_color += self.__ray_color(r, self.max_depth, world)
-                pixel_color /= self.samples_per_pixel
-                _write_color(target, pixel_color)
+                row.extend(color_to_rgb(self.pixel_color(u, v, world)))
                 pbar.update(1)
+            write_row(target, v, row)
+    
+    def pixel_color(self, u:int, v:int, world:Hittable) -> Color:
+        """
+        Averages `samples_per_pixel` samples of pixel (u, v).
+        NOTE: `initialize` must have been called first.
+        """
+        
+        aovs = self.aovs
+        if aovs is not None:
+            aovs.begin_pixel()
+        
+        pixel_color = Color(0, 0, 0)
+        for i in range(self.samples_per_pixel):
+            c = self.sample(u, v, world, i)
+            pixel_color += c
+            if aovs is not None:
+                aovs.add_sample(c)
+        
+        if aovs is not None:
+            aovs.end_pixel(u, v, self.samples_per_pixel)
+        return pixel_color / self.samples_per_pixel
+    
+    def sample(self, u:int, v:int, world:Hittable, index:int = 0) -> Color:
+        """Traces sample number `index` of pixel (u, v)."""
+        self.start_sample(u, v, index)
+        cache = self.hit_cache
+        if cache is None:
+            r = self.get_ray(u, v)
+            if self.__primary is None:
+                return self.__ray_color(r, self.max_depth, world)
+            return self.__ray_color(r, self.max_depth, world, self.__primary.first_hit(r, u, v))
+        
+        primary = cache.get(u, v, index)
+        if primary is None:
+            r = self.get_ray(u, v)
+            rec = world.first_hit(r, 0.001, math.inf) if self.__primary is None else self.__primary.first_hit(r, u, v)
+            primary = cache.put(u, v, index, r, rec)
+        return self.__ray_color(primary[0], self.max_depth, world, primary[1])
+    
+    def start_sample(self, u:int, v:int, index:int) -> None:
+        """Points `render_sampler` (if any) at sample `index` of pixel (u, v) for this thread."""
+        if self.__sampler is not None:
+            bind_sampler(self.__sampler).start_sample(u, v, index)
+        else:
+            unbind_sampler()
+    
+    def render_progressive(self, world:Hittable, passes:int, checkpoint_path:str = None, checkpoint_every:int = 1):
+        """
+        Renders one sample per pixel per pass, yielding `(image, samples)` after each pass.
+        With `checkpoint_path`, accumulated samples are resumed from and saved to that file.
+        """
+        
+        if self.aovs is not None:
+            raise ValueError("AOVs are only recorded by `render`, not by progressive rendering")
+        from progressive import ProgressiveRender
+        if self.hit_cache is not None:
+            self.hit_cache.validate(self, world)
+        return ProgressiveRender(self, world, checkpoint_path, checkpoint_every).run(passes)
     
-    def __initialize(self) -> None:
+    def render_adaptive(self, world:Hittable, target, threshold:float = 0.05, min_spp:int = 8, max_spp:int = None):
+        """
+        Renders with a per-pixel sample count driven by variance estimates, spending
+        `samples_per_pixel` samples per pixel on average. Returns the `AdaptiveResult`
+        with the per-pixel sample-count map.
+        """
+        
+        if self.aovs is not None:
+            raise ValueError("AOVs are only recorded by `render`, not by adaptive rendering")
+        from adaptive import AdaptiveRender
+        if self.hit_cache is not None:
+            self.hit_cache.validate(self, world)
+        result = AdaptiveRender(self, world, threshold, min_spp, max_spp).run()
+        for v, linear_row in enumerate(result.linear):
+            row = []
+            for c in linear_row:
+                row.extend(color_to_rgb(Color(*c)))
+            write_row(target, v, row)
+        return result
+    
+    def render_budget(self, world:Hittable, target, seconds:float, checkpoint_path:str = None):
+        """
+        Renders one sample per pixel per pass for as many passes as fit in `seconds`,
+        instead of `samples_per_pixel`, overrunning by at most one pass. Returns the
+        `BudgetResult` with the samples per pixel reached and the estimated noise.
+        """
+        
+        if self.aovs is not None:
+            raise ValueError("AOVs are only recorded by `render`, not by time-budgeted rendering")
+        import time
+        start = time.perf_counter()
+        from progressive import ProgressiveRender
+        if self.hit_cache is not None:
+            self.hit_cache.validate(self, world)
+        result = ProgressiveRender(self, world, checkpoint_path).run_for(seconds, start=start)
+        for v, row in enumerate(result.image()):
+            write_row(target, v, row.ravel().tolist())
+        return result
+    
+    def initialize(self, world:Hittable = None) -> None:
+        """
+        Sets up the frame. Given the `world`, a pinhole camera (`defocus_angle` 0)
+        with `primary_culling` on also prepares the tiled primary-ray fast path.
+        """
+        
         image_width = self.image_width
-        image_height = int(image_width / self.aspect_ratio)
+        image_height = self.image_height
         
         center = self.lookfrom
         
@@ -97,8 +328,25 @@ class Camera:
         defocus_radius = self.focus_dist * math.tan(math.radians(self.defocus_angle / 2))
         self.__defocus_disk_u = u * defocus_radius
         self.__defocus_disk_v = v * defocus_radius
+        
+        self.depth_histogram = [0] * (self.max_depth + 1)
+        
+        self.__primary = None
+        if world is not None and self.primary_culling and self.defocus_angle <= 0:
+            from primary import PrimaryRays
+            try:
+                self.__primary = PrimaryRays(self, world)
+            except TypeError:
+                # Worlds with instances or procedural objects take the general path.
+                pass
+        
+        # Built again every frame, so changes to `samples_per_pixel` or `seed` take effect.
+        if isinstance(self.sampler, str):
+            self.__sampler = make_sampler(self.sampler, self.samples_per_pixel, self.seed)
+        else:
+            self.__sampler = self.sampler
     
-    def __get_ray(self, u:int, v:int) -> Ray:
+    def get_ray(self, u:int, v:int) -> Ray:
         offset = self.__sample_square()
         pixel_sample = self.__pixel00_loc + (self.__pixel_delta_u * (u + offset.x)) + (self.__pixel_delta_v * (v + offset.y))
         ray_origin = self.__center if self.defocus_angle <= 0 else self.__defocus_disk_sample()
@@ -106,22 +354,54 @@ class Camera:
         return Ray(ray_origin, ray_direction)
         
     def __sample_square(self) -> Vec3:
+        s = active_sampler()
+        if s is not None:
+            a, b = s.next_2d()
+            return Vec3(a - 0.5, b - 0.5, 0)
         return Vec3(random.random() - 0.5, random.random() - 0.5, 0)
         
     def __defocus_disk_sample(self) -> Point3:
-        p = Vec3.rand_in_unit_disk()
+        s = active_sampler()
+        p = Vec3.rand_in_unit_disk() if s is None else sample_unit_disk(s)
         return self.__center + self.__defocus_disk_u * p.x + self.__defocus_disk_v * p.y
     
-    def __ray_color(self, r:Ray, depth:int, world:Hittable) -> Color:
-        if depth <= 0:
-            return Color(0, 0, 0)
+    def __ray_color(self, r:Ray, depth:int, world:Hittable, primary_hit:HitRecord = ...) -> Color:
+        """Color seen along `r`; `primary_hit`, when given, is the already known result of its first intersection."""
+        throughput = Color(1.0, 1.0, 1.0)
+        rr_min_depth = self.rr_min_depth
+        aovs = self.aovs
+        s = active_sampler()
         
-        if rec := world.hit(r, Interval(0.001, math.inf)):
+        for bounce in range(depth):
+            if s is not None:
+                s.start_bounce(bounce)
+            if bounce == 0 and primary_hit is not ...:
+                rec = primary_hit
+            else:
+                rec = world.first_hit(r, 0.001, math.inf)
+            if bounce == 0 and aovs is not None:
+                aovs.record(r, rec)
+            if not rec:
+                self.depth_histogram[bounce + 1] += 1
+                return throughput * sky_color(r)
+            
             attenuation, scattered = rec.mat.scatter(r, rec)
-            if scattered:
-                return attenuation * self.__ray_color(scattered, depth-1, world)
-            return Color(0, 0, 0)
-    
-        unit_direction = r.dir.normalize()
-        a = (unit_direction.y + 1.0) * 0.5
-        return Color(1.0, 1.0, 1.0) * (1.0-a) + Color(0.5, 0.7, 1.0) * a
\ No newline at end of file
+            if not scattered:
+                bounce += 1
+                break
+            throughput = throughput * attenuation
+            
+            # Russian roulette: survivors are reweighted by 1/p, which keeps the estimate unbiased.
+            if rr_min_depth is not None and bounce + 1 >= rr_min_depth:
+                p = min(max(throughput.x, throughput.y, throughput.z), 0.95)
+                if sample_1d() >= p:
+                    bounce += 1
+                    break
+                throughput /= p
+            r = scattered
+        else:
+            bounce = depth
+        
+        # Indexed by the number of segments traced for this path.
+        self.depth_histogram[bounce] += 1
+        return Color(0, 0, 0)
\ No newline at end of file
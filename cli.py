@@ -0,0 +1,205 @@
+"""
+Headless command-line renderer.
+
+    python cli.py --scene final --width 400 --spp 100 --depth 50 --seed 1 --workers 4 --out final.png
+    python cli.py --jobs jobs.json --report report.json
+    python cli.py --scene final --budget 30 --out final.png
+
+A jobs file is a JSON list of objects with any of the option names below
+(`scene`, `width`, `height`, `spp`, `depth`, `seed`, `workers`, `backend`,
+`out`, `budget`); missing ones take the command-line values. All jobs run in this one
+process, which keeps every scene it has built (and its BVH) for later jobs.
+
+Nothing is shown on screen. .png and .ppm files are streamed row by row; other
+image formats are saved through Pillow, which is only imported for them, as
+tqdm is only imported for `--progress`.
+"""
+
+import time
+
+_START = time.perf_counter()
+
+import argparse
+import json
+import math
+import os
+import sys
+
+SCENES = ("final", "few", "instanced", "procedural", "scaled")
+
+# Scenes of instances or procedural cells, which only the Python backend can trace.
+PYTHON_ONLY_SCENES = ("instanced", "procedural")
+
+JOB_FIELDS = ("scene", "width", "height", "spp", "depth", "seed", "workers", "backend", "out", "budget")
+
+def build_world(scene: str, seed: int, backend: str):
+    """Scene `scene` built from `seed`, ready for `backend`: a BVH, or a compiled scene with one."""
+
+    from scenes import final_scene, few_spheres_scene, instanced_scene, procedural_scene, scaled_scene
+    from bvh import BVH
+
+    if scene == "final":
+        world = final_scene(seed)
+    elif scene == "few":
+        world = few_spheres_scene()
+    elif scene == "instanced":
+        world = instanced_scene(seed)
+    elif scene == "procedural":
+        world = procedural_scene(seed=seed)
+    elif scene == "scaled":
+        world = scaled_scene(seed=seed)
+    else:
+        raise ValueError(f"unknown scene '{scene}', expected one of {', '.join(SCENES)}")
+
+    if backend in ("numpy", "numba"):
+        from compiled_scene import CompiledScene
+        world = CompiledScene(world)
+        world.build_bvh()
+        return world
+    return BVH(world)
+
+def check_job(job: dict) -> None:
+    if job["scene"] not in SCENES:
+        raise ValueError(f"unknown scene '{job['scene']}', expected one of {', '.join(SCENES)}")
+    if job["scene"] in PYTHON_ONLY_SCENES and job["backend"] != "python":
+        raise ValueError(f"the {job['scene']} scene needs the python backend, not {job['backend']}")
+
+def make_camera(job: dict, progress: bool):
+    from scenes import final_camera
+
+    cam = final_camera(job["width"], job["spp"], job["depth"])
+    if job["height"]:
+        cam.aspect_ratio = job["width"] / job["height"]
+        cam.fixed_height = job["height"]
+    cam.seed = job["seed"]
+    cam.workers = job["workers"]
+    cam.backend = job["backend"]
+    cam.progress = progress
+    return cam
+
+def write_image(cam, world, path: str, budget: float = None):
+    """
+    Renders into the image file `path`. With a `budget` in seconds, renders
+    for that long instead of `cam.samples_per_pixel` and returns the `BudgetResult`.
+    """
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    def render(target):
+        if budget is None:
+            return cam.render(world, target)
+        return cam.render_budget(world, target, budget)
+
+    from framebuffer import Framebuffer, open_writer
+    if path.lower().endswith((".png", ".ppm", ".pnm")):
+        with open_writer(path, cam.image_width, cam.image_height) as writer:
+            return render(writer)
+
+    framebuffer = Framebuffer(cam.image_width, cam.image_height)
+    result = render(framebuffer)
+    from PIL import Image
+    Image.fromarray(framebuffer.array).save(path)
+    return result
+
+class BatchRenderer:
+    """Runs render jobs one after another, reusing scenes built by earlier jobs."""
+
+    def __init__(self, progress: bool = False) -> None:
+        self.progress = progress
+        self.worlds = {}
+
+    def world(self, job: dict):
+        """The job's scene, built on first use; also returns the seconds spent building it."""
+
+        key = (job["scene"], job["seed"], job["backend"] in ("numpy", "numba"))
+        if key in self.worlds:
+            return self.worlds[key], 0.0
+        start = time.perf_counter()
+        world = self.worlds[key] = build_world(job["scene"], job["seed"], job["backend"])
+        return world, time.perf_counter() - start
+
+    def run(self, job: dict) -> dict:
+        world, build_seconds = self.world(job)
+        cam = make_camera(job, self.progress)
+        start = time.perf_counter()
+        budget = write_image(cam, world, job["out"], job["budget"])
+        result = dict(job, build_seconds=build_seconds, render_seconds=time.perf_counter() - start)
+        if budget is not None:
+            # One pass gives no noise estimate; JSON has no infinity, so it is reported as null.
+            noise = budget.noise if math.isfinite(budget.noise) else None
+            result.update(spp_reached=budget.samples, noise=noise)
+        return result
+
+def load_jobs(path: str, defaults: dict) -> list:
+    with open(path) as f:
+        entries = json.load(f)
+    if not isinstance(entries, list):
+        raise ValueError(f"{path}: expected a JSON list of jobs")
+
+    jobs = []
+    for i, entry in enumerate(entries):
+        unknown = set(entry) - set(JOB_FIELDS)
+        if unknown:
+            raise ValueError(f"{path}: job {i} has unknown fields {', '.join(sorted(unknown))}")
+        job = dict(defaults, **entry)
+        if "out" not in entry:
+            root, ext = os.path.splitext(defaults["out"])
+            job["out"] = f"{root}_{i}{ext}"
+        try:
+            check_job(job)
+        except ValueError as e:
+            raise ValueError(f"{path}: job {i}: {e}") from None
+        jobs.append(job)
+    return jobs
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scene", default="final", choices=SCENES)
+    parser.add_argument("--width", type=int, default=400)
+    parser.add_argument("--height", type=int, default=None, help="default: 16:9 for the given width")
+    parser.add_argument("--spp", type=int, default=100, help="samples per pixel")
+    parser.add_argument("--depth", type=int, default=50, help="maximum bounces per path")
+    parser.add_argument("--seed", type=int, default=None, help="scene and render seed (default: random)")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--backend", default="python", choices=("python", "numpy", "numba"))
+    parser.add_argument("--out", default="out.png")
+    parser.add_argument("--budget", type=float, default=None, metavar="SECONDS",
+                        help="render passes until this time is spent instead of --spp")
+    parser.add_argument("--jobs", metavar="FILE", help="JSON list of jobs to render in this process")
+    parser.add_argument("--progress", action="store_true", help="show a progress bar")
+    parser.add_argument("--report", metavar="FILE", help="write startup and per-job timings as JSON")
+    args = parser.parse_args(argv)
+
+    defaults = {name: getattr(args, name) for name in JOB_FIELDS}
+    try:
+        if args.jobs:
+            jobs = load_jobs(args.jobs, defaults)
+        else:
+            check_job(defaults)
+            jobs = [defaults]
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
+
+    renderer = BatchRenderer(args.progress)
+    startup = time.perf_counter() - _START
+    print(f"startup: {startup * 1e3:.1f} ms", file=sys.stderr)
+
+    results = []
+    for job in jobs:
+        result = renderer.run(job)
+        results.append(result)
+        print(f"{result['out']}: built in {result['build_seconds']:.2f}s, "
+              f"rendered in {result['render_seconds']:.2f}s", file=sys.stderr)
+        if "spp_reached" in result:
+            noise = f"{result['noise']:.4f}" if result["noise"] is not None else "unknown"
+            print(f"{result['out']}: {result['spp_reached']} spp, noise {noise}", file=sys.stderr)
+
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump({"startup_seconds": startup, "jobs": results}, f, indent=2, allow_nan=False)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,449 @@
+from typing import List, Tuple
+import numpy as np
+
+from hittable_list import *
+from sphere import *
+from material import *
+from bvh import *
+
+LAMBERTIAN = 0
+METAL = 1
+DIELECTRIC = 2
+
+def flatten_spheres(world: Hittable, out: List[Sphere]) -> List[Sphere]:
+    """Appends the spheres of `world` to `out` in the order `CompiledScene` packs them."""
+
+    if isinstance(world, Sphere):
+        out.append(world)
+    elif isinstance(world, HittableList):
+        for obj in world.objects:
+            flatten_spheres(obj, out)
+    elif isinstance(world, BVH):
+        stack = [world.root] if world.root else []
+        while stack:
+            node = stack.pop()
+            if node.objects is not None:
+                for obj in node.objects:
+                    flatten_spheres(obj, out)
+            else:
+                stack.append(node.right)
+                stack.append(node.left)
+    else:
+        raise TypeError(f"cannot compile {type(world).__name__} objects")
+    return out
+
+ARRAY_FIELDS = ("centers", "radii", "material", "mat_type", "albedo", "fuzz", "ior")
+BVH_FIELDS = ("bvh_bounds", "bvh_nodes", "bvh_prims")
+
+class _Bounds(Hittable):
+    """Stand-in for sphere `index` while building a BVH from the packed arrays."""
+
+    def __init__(self, index: int, bbox: AABB) -> None:
+        self.index = index
+        self.bbox = bbox
+
+    def bounding_box(self) -> AABB:
+        return self.bbox
+
+class CompiledScene(Hittable):
+    """
+    Structure-of-arrays form of a sphere world: centers, radii and material
+    indices in contiguous buffers, plus a material table of type codes and
+    parameters. The `Material` objects are kept (or rebuilt on demand, for
+    scenes loaded from arrays) so hits still report `rec.mat`.
+
+    `build_bvh` adds a flattened BVH over the same arrays, which `hit` and
+    `hit_batch` then traverse instead of testing every sphere.
+    """
+
+    # Size of the (rays x spheres) blocks `hit_batch` tests at once without a BVH.
+    BATCH_ELEMENTS = 1 << 20
+
+    def __init__(self, world: Hittable = None) -> None:
+        super().__init__()
+        spheres = flatten_spheres(world, []) if world is not None else []
+        n = len(spheres)
+
+        self.centers = np.empty((n, 3))
+        self.radii = np.empty(n)
+        self.material = np.empty(n, dtype=np.int32)
+
+        self.materials: List[Material] = []
+        material_ids = {}
+        for i, s in enumerate(spheres):
+            self.centers[i] = (s.center.x, s.center.y, s.center.z)
+            self.radii[i] = s.radius
+            if id(s.mat) not in material_ids:
+                material_ids[id(s.mat)] = len(self.materials)
+                self.materials.append(s.mat)
+            self.material[i] = material_ids[id(s.mat)]
+
+        m = len(self.materials)
+        self.mat_type = np.empty(m, dtype=np.int8)
+        self.albedo = np.ones((m, 3))
+        self.fuzz = np.zeros(m)
+        self.ior = np.ones(m)
+        for i, mat in enumerate(self.materials):
+            if isinstance(mat, Lambertian):
+                self.mat_type[i] = LAMBERTIAN
+                self.albedo[i] = tuple(mat.albedo)
+            elif isinstance(mat, Metal):
+                self.mat_type[i] = METAL
+                self.albedo[i] = tuple(mat.albedo)
+                self.fuzz[i] = mat.fuzz
+            elif isinstance(mat, Dielectric):
+                self.mat_type[i] = DIELECTRIC
+                self.ior[i] = mat.refraction_index
+            else:
+                raise TypeError(f"cannot compile material {type(mat).__name__}")
+
+        self.bvh_bounds: np.ndarray = None
+        self.bvh_nodes: np.ndarray = None
+        self.bvh_prims: np.ndarray = None
+        self.__update_derived()
+
+    @staticmethod
+    def from_arrays(arrays) -> "CompiledScene":
+        """Rebuilds a scene from `to_arrays` output (or an opened .npz file with those keys)."""
+
+        scene = CompiledScene()
+        for name in ARRAY_FIELDS:
+            setattr(scene, name, np.asarray(arrays[name]))
+        if all(name in arrays for name in BVH_FIELDS):
+            for name in BVH_FIELDS:
+                setattr(scene, name, np.asarray(arrays[name]))
+        scene.materials = [None] * len(scene.mat_type)
+        scene.__update_derived()
+        return scene
+
+    def to_arrays(self) -> dict:
+        arrays = {name: getattr(self, name) for name in ARRAY_FIELDS}
+        if self.bvh_nodes is not None:
+            arrays.update({name: getattr(self, name) for name in BVH_FIELDS})
+        return arrays
+
+    def __update_derived(self) -> None:
+        self.center_sq = np.einsum('ij,ij->i', self.centers, self.centers)
+        self.radius_sq = self.radii ** 2
+        if len(self.radii):
+            lo = (self.centers - self.radii[:, None]).min(axis=0)
+            hi = (self.centers + self.radii[:, None]).max(axis=0)
+            self.bbox = AABB.from_points(Point3(*lo), Point3(*hi))
+        else:
+            self.bbox = AABB()
+        self.__nodes = None
+
+    def __prepare_traversal(self) -> None:
+        # Plain Python lists: per-element access on them is far cheaper than on NumPy arrays.
+        # Built on the first `hit`, so loading a scene for the array-based backends stays cheap.
+        self.__bounds = [tuple(b) for b in self.bvh_bounds.tolist()]
+        self.__nodes = [tuple(n) for n in self.bvh_nodes.tolist()]
+        centers = self.centers.tolist()
+        radius_sq = self.radius_sq.tolist()
+        self.__prims = [(*centers[i], radius_sq[i], i) for i in self.bvh_prims.tolist()]
+
+    def build_bvh(self, max_leaf_size: int = 4) -> BVHStats:
+        """Builds a SAH BVH over the spheres and stores it flattened in `bvh_*` arrays."""
+
+        lo = self.centers - self.radii[:, None]
+        hi = self.centers + self.radii[:, None]
+        proxies = [
+            _Bounds(i, AABB(Interval(l[0], h[0]), Interval(l[1], h[1]), Interval(l[2], h[2])))
+            for i, (l, h) in enumerate(zip(lo.tolist(), hi.tolist()))
+        ]
+        bvh = BVH(proxies, max_leaf_size)
+
+        # Depth-first flattening: node i stores (left, right, first prim, prim count, split axis);
+        # leaves have left = right = -1.
+        bounds, nodes, prims = [], [], []
+        def flatten(node: BVHNode) -> int:
+            index = len(nodes)
+            bounds.append(node.bounds)
+            nodes.append(None)
+            if node.objects is not None:
+                nodes[index] = (-1, -1, len(prims), len(node.objects), node.axis)
+                prims.extend(p.index for p in node.objects)
+            else:
+                left = flatten(node.left)
+                right = flatten(node.right)
+                nodes[index] = (left, right, 0, 0, node.axis)
+            return index
+
+        if bvh.root is not None:
+            flatten(bvh.root)
+        self.bvh_bounds = np.array(bounds, dtype=np.float64).reshape(-1, 6)
+        self.bvh_nodes = np.array(nodes, dtype=np.int32).reshape(-1, 5)
+        self.bvh_prims = np.array(prims, dtype=np.int32)
+        self.__nodes = None
+        return bvh.stats
+
+    def move_spheres(self, indices, centers) -> None:
+        """Moves spheres `indices` to `centers` and refits the BVH bounds (its structure is kept)."""
+
+        if not self.centers.flags.writeable:
+            self.centers = self.centers.copy()
+        self.centers[indices] = centers
+        self.__update_derived()
+        if self.bvh_nodes is None or len(self.bvh_nodes) == 0:
+            return
+
+        lo = (self.centers - self.radii[:, None])[self.bvh_prims]
+        hi = (self.centers + self.radii[:, None])[self.bvh_prims]
+        bounds = self.bvh_bounds.copy()
+        nodes = self.bvh_nodes.tolist()
+        leaves = np.flatnonzero(self.bvh_nodes[:, 0] < 0)
+        starts = self.bvh_nodes[leaves, 2]
+        bounds[leaves, 0::2] = np.minimum.reduceat(lo, starts)
+        bounds[leaves, 1::2] = np.maximum.reduceat(hi, starts)
+
+        # Depth-first layout: children always follow their parent.
+        for i in range(len(nodes) - 1, -1, -1):
+            left, right = nodes[i][0], nodes[i][1]
+            if left >= 0:
+                bounds[i, 0::2] = np.minimum(bounds[left, 0::2], bounds[right, 0::2])
+                bounds[i, 1::2] = np.maximum(bounds[left, 1::2], bounds[right, 1::2])
+        self.bvh_bounds = bounds
+
+    def material_at(self, i: int) -> Material:
+        """Material object of table entry `i`, rebuilt from its parameters if needed."""
+
+        mat = self.materials[i]
+        if mat is None:
+            kind = self.mat_type[i]
+            if kind == LAMBERTIAN:
+                mat = Lambertian(Color(*self.albedo[i].tolist()))
+            elif kind == METAL:
+                mat = Metal(Color(*self.albedo[i].tolist()), float(self.fuzz[i]))
+            elif kind == DIELECTRIC:
+                mat = Dielectric(float(self.ior[i]))
+            else:
+                raise ValueError(f"unknown material type code {kind}")
+            self.materials[i] = mat
+        return mat
+
+    def __len__(self) -> int:
+        return len(self.radii)
+
+    @property
+    def nbytes(self) -> int:
+        """Memory held by the packed geometry and material buffers."""
+        return sum(a.nbytes for a in self.to_arrays().values())
+
+    def bounding_box(self) -> AABB:
+        return self.bbox
+
+    def hit_batch(self, orig: np.ndarray, dir: np.ndarray, t_min: float, t_max: float):
+        """
+        Closest hit of each of a batch of rays.
+        Returns (t, sphere index); rays that miss get t = inf and index -1.
+        With the BVH built, all rays walk it together, a level of (ray, node)
+        pairs at a time; without it, the spheres are tested a chunk at a time.
+        Either way memory stays bounded whatever the number of spheres.
+        """
+
+        n_rays = len(orig)
+        if self.bvh_nodes is not None:
+            return self.__hit_batch_bvh(orig, dir, t_min, t_max)
+
+        t_hit = np.full(n_rays, np.inf)
+        idx = np.full(n_rays, -1)
+        a = np.einsum('ij,ij->i', dir, dir)[:, None]
+        dir_orig = np.einsum('ij,ij->i', dir, orig)[:, None]
+        orig_sq = np.einsum('ij,ij->i', orig, orig)[:, None]
+        chunk = max(1, self.BATCH_ELEMENTS // max(n_rays, 1))
+        for first in range(0, len(self), chunk):
+            centers = self.centers[first:first + chunk]
+
+            # oc = center - orig, expanded so the (rays x spheres) terms come from two matrix products.
+            h = dir @ centers.T - dir_orig
+            c = (self.center_sq[None, first:first + chunk] - 2 * (orig @ centers.T)
+                 + orig_sq - self.radius_sq[None, first:first + chunk])
+
+            disc = h * h - a * c
+            sqrtd = np.sqrt(np.maximum(disc, 0))
+            hit = disc >= 0
+
+            root = (h - sqrtd) / a
+            near_ok = hit & (root > t_min) & (root < t_max)
+            far = (h + sqrtd) / a
+            far_ok = hit & ~near_ok & (far > t_min) & (far < t_max)
+            t = np.where(near_ok, root, np.where(far_ok, far, np.inf))
+
+            # Strictly closer only, so ties keep the lowest sphere index as a single argmin would.
+            best = np.argmin(t, axis=1)
+            t_best = t[np.arange(n_rays), best]
+            closer = t_best < t_hit
+            t_hit[closer] = t_best[closer]
+            idx[closer] = best[closer] + first
+        return t_hit, idx
+
+    def __hit_batch_bvh(self, orig: np.ndarray, dir: np.ndarray, t_min: float, t_max: float):
+        n_rays = len(orig)
+        closest = np.full(n_rays, t_max, dtype=np.float64)
+        best = np.full(n_rays, -1)
+        if len(self.bvh_nodes) == 0:
+            return np.full(n_rays, np.inf), best
+
+        with np.errstate(divide='ignore'):
+            inv = np.where(dir != 0, 1.0 / dir, 1e30)
+        a = np.einsum('ij,ij->i', dir, dir)
+        left, right, start, count = (self.bvh_nodes[:, k] for k in range(4))
+
+        ray = np.arange(n_rays)
+        node = np.zeros(n_rays, dtype=np.int32)
+        while len(ray):
+            # Slab test of every pair against its node's box, clipped to the ray's closest hit so far.
+            b = self.bvh_bounds[node]
+            o, d = orig[ray], inv[ray]
+            t0 = (b[:, 0::2] - o) * d
+            t1 = (b[:, 1::2] - o) * d
+            lo = np.maximum(np.minimum(t0, t1).max(axis=1), t_min)
+            hi = np.minimum(np.maximum(t0, t1).min(axis=1), closest[ray])
+            keep = hi > lo
+            ray, node = ray[keep], node[keep]
+
+            leaf = left[node] < 0
+            if leaf.any():
+                self.__hit_leaves(orig, dir, a, ray[leaf], node[leaf], start, count, t_min, closest, best)
+            inner = ~leaf
+            ray = np.concatenate((ray[inner], ray[inner]))
+            node = np.concatenate((left[node[inner]], right[node[inner]]))
+
+        t_hit = np.where(best >= 0, closest, np.inf)
+        return t_hit, best
+
+    def __hit_leaves(self, orig, dir, a, ray, node, start, count, t_min, closest, best) -> None:
+        """Tests every (ray, leaf) pair's spheres, lowering `closest` and setting `best` in place."""
+
+        n = count[node]
+        pair = np.repeat(np.arange(len(ray)), n)
+        offset = np.arange(len(pair)) - np.repeat(np.cumsum(n) - n, n)
+        i = self.bvh_prims[start[node][pair] + offset]
+        ray = ray[pair]
+
+        oc = self.centers[i] - orig[ray]
+        d = dir[ray]
+        ar = a[ray]
+        h = np.einsum('ij,ij->i', d, oc)
+        c = np.einsum('ij,ij->i', oc, oc) - self.radius_sq[i]
+        disc = h * h - ar * c
+        sqrtd = np.sqrt(np.maximum(disc, 0))
+        limit = closest[ray]
+
+        root = (h - sqrtd) / ar
+        near_ok = (disc >= 0) & (root > t_min) & (root < limit)
+        far = (h + sqrtd) / ar
+        far_ok = (disc >= 0) & ~near_ok & (far > t_min) & (far < limit)
+        t = np.where(near_ok, root, np.where(far_ok, far, np.inf))
+
+        found = t < limit
+        ray, t, i = ray[found], t[found], i[found]
+        np.minimum.at(closest, ray, t)
+        won = t == closest[ray]
+        best[ray[won]] = i[won]
+
+    def closest(self, r: Ray, t_min: float, t_max: float) -> Tuple[float, int]:
+        """`(t, sphere index)` of the nearest hit, or None; `record` takes the index as its object."""
+
+        if self.bvh_nodes is not None:
+            if self.__nodes is None:
+                self.__prepare_traversal()
+            return self.__closest_bvh(r, t_min, t_max)
+        if len(self) == 0:
+            return None
+
+        orig = np.array((r.orig.x, r.orig.y, r.orig.z))
+        dir = np.array((r.dir.x, r.dir.y, r.dir.z))
+        oc = self.centers - orig
+        a = dir @ dir
+        h = oc @ dir
+        c = np.einsum('ij,ij->i', oc, oc) - self.radius_sq
+
+        disc = h * h - a * c
+        sqrtd = np.sqrt(np.maximum(disc, 0))
+        root = (h - sqrtd) / a
+        near_ok = (disc >= 0) & (root > t_min) & (root < t_max)
+        far = (h + sqrtd) / a
+        far_ok = (disc >= 0) & ~near_ok & (far > t_min) & (far < t_max)
+        t = np.where(near_ok, root, np.where(far_ok, far, np.inf))
+
+        i = int(np.argmin(t))
+        if t[i] == np.inf:
+            return None
+        return float(t[i]), i
+
+    def record(self, r: Ray, t: float, i: int) -> HitRecord:
+        rec = HitRecord()
+        rec.t = t
+        rec.p = r.at(t)
+        center = Point3(*self.centers[i].tolist())
+        outward_normal = (rec.p - center) / float(self.radii[i])
+        rec.set_face_normal(r, outward_normal)
+        rec.mat = self.material_at(self.material[i])
+        rec.obj = i
+        return rec
+
+    def __closest_bvh(self, r: Ray, t_min: float, t_max: float) -> Tuple[float, int]:
+        bounds, nodes, prims = self.__bounds, self.__nodes, self.__prims
+        if not nodes:
+            return None
+
+        ox, oy, oz = r.orig.x, r.orig.y, r.orig.z
+        dx, dy, dz = r.dir.x, r.dir.y, r.dir.z
+        ix = 1.0 / dx if dx else 1e30
+        iy = 1.0 / dy if dy else 1e30
+        iz = 1.0 / dz if dz else 1e30
+        dirs = (dx, dy, dz)
+        a = dx*dx + dy*dy + dz*dz
+        t_lo = t_min
+        closest = t_max
+        best = -1
+
+        stack = [0]
+        while stack:
+            node = stack.pop()
+
+            xmin, xmax, ymin, ymax, zmin, zmax = bounds[node]
+            t0 = (xmin - ox) * ix; t1 = (xmax - ox) * ix
+            if t0 > t1: t0, t1 = t1, t0
+            lo = t0 if t0 > t_lo else t_lo
+            hi = t1 if t1 < closest else closest
+            if hi <= lo: continue
+            t0 = (ymin - oy) * iy; t1 = (ymax - oy) * iy
+            if t0 > t1: t0, t1 = t1, t0
+            if t0 > lo: lo = t0
+            if t1 < hi: hi = t1
+            if hi <= lo: continue
+            t0 = (zmin - oz) * iz; t1 = (zmax - oz) * iz
+            if t0 > t1: t0, t1 = t1, t0
+            if t0 > lo: lo = t0
+            if t1 < hi: hi = t1
+            if hi <= lo: continue
+
+            left, right, start, count, axis = nodes[node]
+            if left < 0:
+                for k in range(start, start + count):
+                    cx, cy, cz, rsq, i = prims[k]
+                    ocx = cx - ox; ocy = cy - oy; ocz = cz - oz
+                    h = dx*ocx + dy*ocy + dz*ocz
+                    disc = h*h - a*(ocx*ocx + ocy*ocy + ocz*ocz - rsq)
+                    if disc < 0: continue
+                    sqrtd = math.sqrt(disc)
+                    root = (h - sqrtd) / a
+                    if not t_lo < root < closest:
+                        root = (h + sqrtd) / a
+                        if not t_lo < root < closest: continue
+                    closest = root
+                    best = i
+                continue
+
+            if dirs[axis] < 0:
+                stack.append(left)
+                stack.append(right)
+            else:
+                stack.append(right)
+                stack.append(left)
+
+        if best < 0:
+            return None
+        return closest, best
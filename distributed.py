@@ -0,0 +1,352 @@
+"""
+Distributed rendering: a coordinator splits a render into work units (one
+tile for one slice of the samples) and hands them to worker processes that
+connect over TCP, on this machine or others.
+
+    python distributed.py serve scene.json out.png --port 5000 --passes 4
+    python distributed.py work coordinator-host:5000      # on every worker machine
+
+Each worker receives the scene once, then renders units and sends back
+float sums of their samples. Units of a worker that disconnects go back in
+the queue, and units running much longer than usual are handed out a second
+time; whichever copy finishes first is kept. Every unit has its own seed, so
+both copies produce the same samples and the image does not depend on which
+worker rendered what, or in which order results arrived.
+
+Messages are a JSON header plus an optional binary payload, so only the
+scene description and raw float arrays ever cross the wire.
+"""
+
+import argparse
+import collections
+import json
+import multiprocessing as mp
+import random
+import socket
+import socketserver
+import struct
+import threading
+import time
+from typing import Dict, List, Tuple
+import numpy as np
+
+from scene_io import *
+from parallel import Tile, make_tiles, tile_seed
+from framebuffer import to_rgb8
+
+_HEADER = struct.Struct(">IQ")
+
+def send_message(sock: socket.socket, header: dict, payload: bytes = b"") -> None:
+    data = json.dumps(header).encode()
+    sock.sendall(_HEADER.pack(len(data), len(payload)) + data + payload)
+
+def _recv_exact(sock: socket.socket, n: int) -> bytes:
+    buf = bytearray()
+    while len(buf) < n:
+        chunk = sock.recv(min(n - len(buf), 1 << 20))
+        if not chunk:
+            raise ConnectionError("connection closed")
+        buf += chunk
+    return bytes(buf)
+
+def recv_message(sock: socket.socket) -> Tuple[dict, bytes]:
+    header_size, payload_size = _HEADER.unpack(_recv_exact(sock, _HEADER.size))
+    header = json.loads(_recv_exact(sock, header_size))
+    return header, _recv_exact(sock, payload_size) if payload_size else b""
+
+def _sampler_name(cam: Camera):
+    if cam.sampler is None or isinstance(cam.sampler, str):
+        return cam.sampler
+    return next(name for name, cls in SAMPLERS.items() if type(cam.sampler) is cls)
+
+def pass_samples(samples_per_pixel: int, passes: int, index: int) -> Tuple[int, int]:
+    """First sample index and sample count of pass `index`."""
+    first = samples_per_pixel * index // passes
+    return first, samples_per_pixel * (index + 1) // passes - first
+
+class Coordinator:
+    """
+    Serves the work units of one render to connecting workers and merges
+    their results. `start` listens in background threads; `wait` blocks until
+    every unit is in and returns the linear image.
+    """
+
+    def __init__(self, cam: Camera, world: Hittable, host: str = "127.0.0.1", port: int = 0,
+                 passes: int = 1, straggler_after: float = None) -> None:
+        cam.initialize()
+        self.cam = cam
+        self.passes = max(1, min(passes, cam.samples_per_pixel))
+        self.straggler_after = straggler_after
+        self.seed = cam.seed if cam.seed is not None else random.getrandbits(64)
+
+        self.scene = scene_to_dict(world, cam)
+        self.settings = {
+            "seed": self.seed,
+            "rr_min_depth": cam.rr_min_depth,
+            "sampler": _sampler_name(cam),
+        }
+
+        self.tiles = make_tiles(cam.image_width, cam.image_height, cam.tile_size)
+        self.accum = np.zeros((cam.image_height, cam.image_width, 3))
+        self.pending = collections.deque((t.index, p) for t in self.tiles for p in range(self.passes))
+        self.unit_count = len(self.pending)
+        self.running: Dict[Tuple[int, int], List[Tuple[int, float]]] = {}
+        self.done = set()
+        self.partial: Dict[int, Dict[int, np.ndarray]] = {}
+        self.durations: List[float] = []
+        self.reassigned = 0
+        self.cond = threading.Condition()
+
+        coordinator = self
+        class Handler(socketserver.BaseRequestHandler):
+            def handle(self) -> None:
+                coordinator._serve(self.request)
+
+        self.server = socketserver.ThreadingTCPServer((host, port), Handler, bind_and_activate=False)
+        self.server.daemon_threads = True
+        self.server.allow_reuse_address = True
+        self.server.server_bind()
+        self.server.server_activate()
+        self.__thread = None
+
+    @property
+    def address(self) -> Tuple[str, int]:
+        return self.server.server_address[:2]
+
+    @property
+    def complete(self) -> bool:
+        return len(self.done) == self.unit_count
+
+    def start(self) -> None:
+        self.__thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.__thread.start()
+
+    def close(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+    def wait(self, progress: bool = True) -> np.ndarray:
+        """Blocks until every unit has been merged; returns the (height, width, 3) linear image."""
+
+        pbar = progress_bar(self.unit_count, progress)
+        shown = 0
+        with self.cond:
+            while not self.complete:
+                self.cond.wait(0.5)
+                pbar.update(len(self.done) - shown)
+                shown = len(self.done)
+        pbar.update(len(self.done) - shown)
+        pbar.close()
+        return self.accum / self.cam.samples_per_pixel
+
+    def _straggler_limit(self) -> float:
+        if self.straggler_after is not None:
+            return self.straggler_after
+        if not self.durations:
+            return float("inf")
+        return max(1.0, 4 * sum(self.durations) / len(self.durations))
+
+    def _next_unit(self, worker: int):
+        """Next unit for `worker`, blocking while there is none; None once the render is complete."""
+
+        with self.cond:
+            while not self.complete:
+                while self.pending:
+                    unit = self.pending.popleft()
+                    if unit not in self.done:
+                        self.running.setdefault(unit, []).append((worker, time.monotonic()))
+                        return unit
+
+                # Nothing queued: back up the oldest unit that is taking too long elsewhere.
+                now, limit = time.monotonic(), self._straggler_limit()
+                stragglers = [
+                    (owners[0][1], unit) for unit, owners in self.running.items()
+                    if len(owners) == 1 and owners[0][0] != worker and now - owners[0][1] > limit
+                ]
+                if stragglers:
+                    _, unit = min(stragglers)
+                    self.running[unit].append((worker, now))
+                    self.reassigned += 1
+                    return unit
+                self.cond.wait(0.25)
+            return None
+
+    def _release(self, worker: int) -> None:
+        """Requeues the units of a worker that went away."""
+
+        with self.cond:
+            for unit in list(self.running):
+                owners = [o for o in self.running[unit] if o[0] != worker]
+                if owners:
+                    self.running[unit] = owners
+                    continue
+                del self.running[unit]
+                if unit not in self.done:
+                    self.pending.appendleft(unit)
+                    self.reassigned += 1
+            self.cond.notify_all()
+
+    def _merge(self, worker: int, unit: Tuple[int, int], sums: np.ndarray) -> None:
+        with self.cond:
+            owners = self.running.pop(unit, [])
+            if unit in self.done:
+                return
+            for w, start in owners:
+                if w == worker:
+                    self.durations.append(time.monotonic() - start)
+            self.done.add(unit)
+
+            # Passes of a tile are summed in pass order once all are in, so arrival order never matters.
+            tile_index, pass_index = unit
+            passes = self.partial.setdefault(tile_index, {})
+            passes[pass_index] = sums
+            if len(passes) == self.passes:
+                t = self.tiles[tile_index]
+                total = passes[0]
+                for p in range(1, self.passes):
+                    total = total + passes[p]
+                self.accum[t.y0:t.y1, t.x0:t.x1] = total
+                del self.partial[tile_index]
+            self.cond.notify_all()
+
+    def _serve(self, sock: socket.socket) -> None:
+        worker = id(threading.current_thread())
+        try:
+            header, _ = recv_message(sock)
+            if header.get("type") != "hello":
+                return
+            send_message(sock, {"type": "scene", "scene": self.scene, "settings": self.settings})
+
+            while True:
+                unit = self._next_unit(worker)
+                if unit is None:
+                    send_message(sock, {"type": "done"})
+                    return
+                t = self.tiles[unit[0]]
+                first, count = pass_samples(self.cam.samples_per_pixel, self.passes, unit[1])
+                send_message(sock, {
+                    "type": "work", "tile": t.index, "pass": unit[1],
+                    "rect": [t.x0, t.y0, t.x1, t.y1], "first_sample": first, "samples": count,
+                })
+
+                header, payload = recv_message(sock)
+                shape = (t.y1 - t.y0, t.x1 - t.x0, 3)
+                self._merge(worker, unit, np.frombuffer(payload, dtype=np.float64).reshape(shape))
+        except (ConnectionError, OSError, ValueError):
+            pass
+        finally:
+            self._release(worker)
+
+def render_unit(cam: Camera, world: Hittable, seed, tile: Tile, first_sample: int, samples: int) -> np.ndarray:
+    """Sum of samples `first_sample` .. `first_sample + samples - 1` of every pixel of `tile`."""
+
+    unit_seed = tile_seed(seed, f"{tile.index}:{first_sample}")
+    random.seed(unit_seed)
+    if cam.render_sampler is not None:
+        bind_sampler(cam.render_sampler).reseed(unit_seed)
+
+    out = np.zeros((tile.y1 - tile.y0, tile.x1 - tile.x0, 3))
+    for v in range(tile.y0, tile.y1):
+        row = out[v - tile.y0]
+        for u in range(tile.x0, tile.x1):
+            c = Color(0, 0, 0)
+            for i in range(first_sample, first_sample + samples):
+                c += cam.sample(u, v, world, i)
+            row[u - tile.x0] = tuple(c)
+    return out
+
+def run_worker(address: Tuple[str, int], max_units: int = None) -> int:
+    """
+    Connects to the coordinator at `address` and renders units until it reports
+    the job done. Returns the number of units rendered. `max_units` makes the
+    worker drop the connection after that many units (for testing failover).
+    """
+
+    rendered = 0
+    with socket.create_connection(address) as sock:
+        send_message(sock, {"type": "hello"})
+        header, _ = recv_message(sock)
+        world, cam = scene_from_dict(header["scene"])
+        world = CompiledScene(world)
+        world.build_bvh()
+        settings = header["settings"]
+        cam.rr_min_depth = settings["rr_min_depth"]
+        cam.sampler = settings["sampler"]
+        cam.seed = settings["seed"]
+        cam.initialize(world)
+
+        while max_units is None or rendered < max_units:
+            header, _ = recv_message(sock)
+            if header["type"] == "done":
+                break
+            x0, y0, x1, y1 = header["rect"]
+            tile = Tile(header["tile"], x0, y0, x1, y1)
+            sums = render_unit(cam, world, settings["seed"], tile, header["first_sample"], header["samples"])
+            send_message(sock, {"type": "result", "tile": header["tile"], "pass": header["pass"]}, sums.tobytes())
+            rendered += 1
+    return rendered
+
+def spawn_local_workers(address: Tuple[str, int], count: int) -> List[mp.Process]:
+    """Starts `count` worker processes on this machine, e.g. for testing."""
+
+    workers = [mp.Process(target=run_worker, args=(address,), daemon=True) for _ in range(count)]
+    for w in workers:
+        w.start()
+    return workers
+
+def render_distributed(cam: Camera, world: Hittable, target, host: str = "127.0.0.1", port: int = 0,
+                       passes: int = 1, local_workers: int = 0) -> np.ndarray:
+    """
+    Renders `world` through a `Coordinator` on (`host`, `port`), writing rows into `target`
+    like `Camera.render`, and returns the linear image. With `local_workers`, that many
+    workers are started on this machine as well.
+    """
+
+    coordinator = Coordinator(cam, world, host, port, passes)
+    coordinator.start()
+    workers = spawn_local_workers(coordinator.address, local_workers) if local_workers else []
+    try:
+        linear = coordinator.wait(cam.progress)
+    finally:
+        coordinator.close()
+        for w in workers:
+            w.join(timeout=5)
+
+    for v, row in enumerate(to_rgb8(linear)):
+        write_row(target, v, row.ravel().tolist())
+    return linear
+
+def _address(s: str) -> Tuple[str, int]:
+    host, _, port = s.rpartition(":")
+    return host or "127.0.0.1", int(port)
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    serve = commands.add_parser("serve", help="coordinate a render of a scene file")
+    serve.add_argument("scene", help="scene file (.json or .npz) with a camera")
+    serve.add_argument("out", help="output image (.png or .ppm)")
+    serve.add_argument("--host", default="0.0.0.0")
+    serve.add_argument("--port", type=int, default=5000)
+    serve.add_argument("--passes", type=int, default=1, help="split each tile's samples into this many units")
+    serve.add_argument("--local-workers", type=int, default=0, help="also start this many workers here")
+
+    work = commands.add_parser("work", help="render units for a coordinator")
+    work.add_argument("address", help="coordinator HOST:PORT")
+
+    args = parser.parse_args(argv)
+    if args.command == "work":
+        print(f"rendered {run_worker(_address(args.address))} units")
+        return 0
+
+    from framebuffer import open_writer
+    world, cam = load_scene(args.scene, bvh=False)
+    if cam is None:
+        parser.error(f"scene '{args.scene}' has no camera")
+    with open_writer(args.out, cam.image_width, cam.image_height) as writer:
+        render_distributed(cam, world, writer, args.host, args.port, args.passes, args.local_workers)
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,127 @@
+import struct
+import zlib
+import numpy as np
+
+def to_rgb8(color: np.ndarray) -> np.ndarray:
+    """Vectorized `color_to_rgb`: linear color in, gamma-corrected uint8 out."""
+
+    gamma = np.sqrt(np.maximum(color, 0))
+    return (256 * np.clip(gamma, 0, 0.999)).astype(np.uint8)
+
+class Framebuffer:
+    """
+    Preallocated (height, width, 3) uint8 image that `Camera.render` writes rows into.
+    With `path`, the pixels live in a memory-mapped file instead of RAM.
+    """
+
+    def __init__(self, width: int, height: int, path: str = None) -> None:
+        self.width = width
+        self.height = height
+        if path is None:
+            self.array = np.zeros((height, width, 3), dtype=np.uint8)
+        else:
+            self.array = np.memmap(path, dtype=np.uint8, mode='w+', shape=(height, width, 3))
+
+    def write_row(self, v: int, row) -> None:
+        self.array[v] = np.asarray(row, dtype=np.uint8).reshape(self.width, 3)
+
+    def close(self) -> None:
+        if isinstance(self.array, np.memmap):
+            self.array.flush()
+
+    def __enter__(self) -> "Framebuffer":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+class _ScanlineWriter:
+    """Base of the streaming writers: rows must arrive in order, top to bottom."""
+
+    def __init__(self, path: str, width: int, height: int) -> None:
+        self.width = width
+        self.height = height
+        self.next_row = 0
+        self.file = open(path, "wb")
+        self._write_header()
+
+    def write_row(self, v: int, row) -> None:
+        if v != self.next_row:
+            raise ValueError(f"rows must be written in order: expected row {self.next_row}, got {v}")
+        data = bytes(row) if not isinstance(row, np.ndarray) else row.astype(np.uint8).tobytes()
+        if len(data) != self.width * 3:
+            raise ValueError(f"row {v} has {len(data)} bytes, expected {self.width * 3}")
+        self._write_data(data)
+        self.next_row += 1
+
+    def close(self) -> None:
+        if self.file.closed:
+            return
+        try:
+            if self.next_row != self.height:
+                raise ValueError(f"image closed after {self.next_row} of {self.height} rows")
+            self._write_footer()
+        finally:
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self.file.close()
+
+    def _write_header(self) -> None:
+        pass
+
+    def _write_data(self, data: bytes) -> None:
+        self.file.write(data)
+
+    def _write_footer(self) -> None:
+        pass
+
+class PPMWriter(_ScanlineWriter):
+    """Streams rows straight into a binary (P6) PPM file."""
+
+    def _write_header(self) -> None:
+        self.file.write(f"P6\n{self.width} {self.height}\n255\n".encode("ascii"))
+
+class PNGWriter(_ScanlineWriter):
+    """Streams rows into an 8-bit RGB PNG, compressing as it goes."""
+
+    CHUNK_SIZE = 1 << 16
+
+    def _write_header(self) -> None:
+        self.file.write(b"\x89PNG\r\n\x1a\n")
+        self._chunk(b"IHDR", struct.pack(">IIBBBBB", self.width, self.height, 8, 2, 0, 0, 0))
+        self.compressor = zlib.compressobj()
+        self.pending = bytearray()
+
+    def _write_data(self, data: bytes) -> None:
+        # Every scanline starts with its filter type; 0 means unfiltered.
+        self.pending += self.compressor.compress(b"\x00" + data)
+        if len(self.pending) >= self.CHUNK_SIZE:
+            self._chunk(b"IDAT", bytes(self.pending))
+            self.pending.clear()
+
+    def _write_footer(self) -> None:
+        self.pending += self.compressor.flush()
+        self._chunk(b"IDAT", bytes(self.pending))
+        self._chunk(b"IEND", b"")
+
+    def _chunk(self, kind: bytes, data: bytes) -> None:
+        self.file.write(struct.pack(">I", len(data)))
+        self.file.write(kind)
+        self.file.write(data)
+        self.file.write(struct.pack(">I", zlib.crc32(kind + data) & 0xffffffff))
+
+def open_writer(path: str, width: int, height: int):
+    """Streaming writer for `path`, chosen by its extension (.png or .ppm)."""
+
+    if path.lower().endswith(".png"):
+        return PNGWriter(path, width, height)
+    if path.lower().endswith((".ppm", ".pnm")):
+        return PPMWriter(path, width, height)
+    raise ValueError(f"no streaming writer for '{path}', use .png or .ppm")
@@ -0,0 +1,102 @@
+from typing import Dict, Tuple
+
+from camera import *
+from compiled_scene import *
+from instance import *
+from procedural import *
+
+def geometry_key(world: Hittable) -> tuple:
+    """Identity, placement and size of everything in `world`, but not their materials."""
+
+    if isinstance(world, CompiledScene):
+        return (id(world), len(world), world.centers.tobytes(), world.radii.tobytes())
+    if isinstance(world, Sphere):
+        return (id(world), tuple(world.center), world.radius)
+    if isinstance(world, Instance):
+        t = world.transform
+        return (id(world), tuple(t.offset), t.scale, t.cos, t.sin, geometry_key(world.geometry))
+    if isinstance(world, ProceduralGrid):
+        return (id(world), world.seed, world.half_extent, world.cell_size)
+    if isinstance(world, HittableList):
+        return tuple(geometry_key(obj) for obj in world.objects)
+    if isinstance(world, BVH):
+        key = []
+        stack = [world.root] if world.root else []
+        while stack:
+            node = stack.pop()
+            if node.objects is not None:
+                key.extend(geometry_key(obj) for obj in node.objects)
+            else:
+                stack.append(node.right)
+                stack.append(node.left)
+        return tuple(key)
+    raise TypeError(f"cannot cache hits against {type(world).__name__} objects")
+
+def camera_key(cam: Camera) -> tuple:
+    """Settings that decide where every primary ray of a render goes."""
+
+    sampler = SAMPLERS.get(cam.sampler) if isinstance(cam.sampler, str) else type(cam.sampler)
+    return (
+        cam.image_width, cam.image_height, cam.samples_per_pixel, cam.vfov,
+        tuple(cam.lookfrom), tuple(cam.lookat), tuple(cam.vup),
+        cam.defocus_angle, cam.focus_dist, cam.seed,
+        sampler.__name__,
+    )
+
+class PrimaryHitCache:
+    """
+    First intersection of every pixel sample, kept between renders so a re-render
+    after a material-only edit traces only the secondary bounces. Each entry holds
+    the sample's primary ray (and with it the pixel and lens offsets it used) and
+    its hit record: point, normal, front face and the object that was hit, whose
+    current material is looked up again on reuse.
+    Assign an instance to `Camera.hit_cache`; it empties itself when the camera
+    settings or the scene geometry differ from those it was filled with.
+    """
+
+    def __init__(self) -> None:
+        self.entries: Dict[Tuple[int, int, int], Tuple[Ray, HitRecord]] = {}
+        self.key: tuple = None
+        self.world: Hittable = None
+        self.reused = 0
+        self.traced = 0
+
+    def clear(self) -> None:
+        self.entries.clear()
+        self.key = None
+
+    def validate(self, cam: Camera, world: Hittable) -> bool:
+        """Empties the cache unless it was filled for `cam` and `world` as they are now; True if kept."""
+
+        key = (id(world), camera_key(cam), geometry_key(world))
+        kept = key == self.key
+        if not kept:
+            self.entries.clear()
+            self.key = key
+        self.world = world
+        self.reused = self.traced = 0
+        return kept
+
+    def get(self, u: int, v: int, index: int) -> Tuple[Ray, HitRecord]:
+        """Cached `(ray, record)` of sample `index` of pixel (u, v), or None; a miss has record None."""
+
+        entry = self.entries.get((u, v, index))
+        if entry is None:
+            return None
+        rec = entry[1]
+        if rec is not None:
+            obj = rec.obj
+            rec.mat = self.world.material_at(self.world.material[obj]) if isinstance(obj, int) else obj.mat
+        self.reused += 1
+        return entry
+
+    def put(self, u: int, v: int, index: int, r: Ray, rec: HitRecord) -> Tuple[Ray, HitRecord]:
+        entry = (r, rec)
+        self.entries[(u, v, index)] = entry
+        self.traced += 1
+        return entry
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.reused + self.traced
+        return self.reused / total if total else 0.0
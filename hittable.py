@@ -1,7 +1,8 @@
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Tuple
 
 from ray import *
 from interval import *
+from aabb import *
 
 if TYPE_CHECKING:
     from material import Material
@@ -13,6 +14,7 @@ class HitRecord:
         self.t: float
         self.front_face: bool
         self.mat: Material
+        self.obj = None
         
     def set_face_normal(self, r: Ray, outward_normal: Vec3) -> None:
         """
@@ -24,5 +26,35 @@ class HitRecord:
         self.normal = outward_normal if self.front_face else -outward_normal
 
 class Hittable:
+    """
+    Intersections are found in two steps: `closest` is a distance-only search
+    that returns the winning `(t, object)` without building anything, then
+    `record` builds the one `HitRecord` of that winner.
+    """
+    
+    __slots__ = ()
+    
+    # Primitives answer `distance` directly; aggregates search their children in `closest`.
+    primitive = False
+    
+    def closest(self, r: Ray, t_min: float, t_max: float) -> Tuple[float, "Hittable"]:
+        """`(t, object)` of the nearest hit with t_min < t < t_max, or None."""
+        raise NotImplementedError()
+    
+    def record(self, r: Ray, t: float, obj) -> HitRecord:
+        """Builds the hit record of `(t, obj)` as returned by `closest`."""
+        return obj.record(r, t, obj)
+    
+    def occluded(self, r: Ray, t_min: float, t_max: float) -> bool:
+        """Any-hit query: whether anything is hit with t_min < t < t_max."""
+        return self.closest(r, t_min, t_max) is not None
+    
+    def first_hit(self, r: Ray, t_min: float, t_max: float) -> HitRecord:
+        found = self.closest(r, t_min, t_max)
+        return None if found is None else self.record(r, found[0], found[1])
+    
     def hit(self, r: Ray, ray_t: Interval) -> HitRecord:
+        return self.first_hit(r, ray_t.min, ray_t.max)
+    
+    def bounding_box(self) -> AABB:
         raise NotImplementedError()
\ No newline at end of file
@@ -6,20 +6,36 @@ class HittableList(Hittable):
     def __init__(self) -> None:
         super().__init__()
         self.objects: List[Hittable] = []
+        self.bbox = AABB()
 
     def clear(self):
         self.objects.clear()
+        self.bbox = AABB()
         
     def add(self, object: Hittable):
         self.objects.append(object)
+        self.bbox = AABB.surround(self.bbox, object.bounding_box())
 
-    def hit(self, r: Ray, ray_t: Interval) -> HitRecord:
-        rec = None
-        closest_so_far = ray_t.max
+    def closest(self, r: Ray, t_min: float, t_max: float) -> Tuple[float, Hittable]:
+        best = None
+        closest_so_far = t_max
 
         for object in self.objects:
-            if tmp_rec := object.hit(r, Interval(ray_t.min, closest_so_far)):
-                rec = tmp_rec
-                closest_so_far = rec.t
+            if object.primitive:
+                t = object.distance(r, t_min, closest_so_far)
+                if t < closest_so_far:
+                    best = object
+                    closest_so_far = t
+            elif found := object.closest(r, t_min, closest_so_far):
+                closest_so_far, best = found
 
-        return rec
\ No newline at end of file
+        return None if best is None else (closest_so_far, best)
+    
+    def occluded(self, r: Ray, t_min: float, t_max: float) -> bool:
+        for object in self.objects:
+            if object.occluded(r, t_min, t_max):
+                return True
+        return False
+    
+    def bounding_box(self) -> AABB:
+        return self.bbox
\ No newline at end of file
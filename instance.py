@@ -0,0 +1,105 @@
+from typing import Tuple
+
+from hittable import *
+from material import Material
+
+class Transform:
+    """
+    Uniform scale, then a rotation about the y axis, then a translation.
+    Such transforms keep spheres spheres and map a ray's parameter t unchanged
+    between world and local space.
+    """
+
+    __slots__ = 'offset', 'scale', 'cos', 'sin'
+
+    def __init__(self, translate: Vec3 = None, scale: float = 1.0, rotate_y: float = 0.0) -> None:
+        if scale <= 0:
+            raise ValueError("scale must be positive")
+        self.offset = translate if translate is not None else Vec3(0, 0, 0)
+        self.scale = scale
+        theta = math.radians(rotate_y)
+        self.cos = math.cos(theta)
+        self.sin = math.sin(theta)
+
+    def ray_to_local(self, r: Ray) -> Ray:
+        s, c, sn = 1.0 / self.scale, self.cos, self.sin
+        o, d = r.orig - self.offset, r.dir
+        return Ray(
+            Point3((c*o.x - sn*o.z) * s, o.y * s, (sn*o.x + c*o.z) * s),
+            Vec3((c*d.x - sn*d.z) * s, d.y * s, (sn*d.x + c*d.z) * s),
+        )
+
+    def vector_to_world(self, v: Vec3) -> Vec3:
+        """Rotates a local direction into world space (normals stay unit length)."""
+        c, sn = self.cos, self.sin
+        return Vec3(c*v.x + sn*v.z, v.y, -sn*v.x + c*v.z)
+
+    def point_to_world(self, p: Point3) -> Point3:
+        return self.vector_to_world(p) * self.scale + self.offset
+
+    def box_to_world(self, box: AABB) -> AABB:
+        corners = [
+            self.point_to_world(Point3(x, y, z))
+            for x in (box.x.min, box.x.max) for y in (box.y.min, box.y.max) for z in (box.z.min, box.z.max)
+        ]
+        return AABB(
+            Interval(min(p.x for p in corners), max(p.x for p in corners)),
+            Interval(min(p.y for p in corners), max(p.y for p in corners)),
+            Interval(min(p.z for p in corners), max(p.z for p in corners)),
+        )
+
+class Instance(Hittable):
+    """
+    Shared `geometry` (a sphere, list or BVH) placed in the scene through a
+    `Transform`, optionally with its own `material` in place of the geometry's.
+    Many instances can reference one geometry, which is stored only once.
+    """
+
+    __slots__ = 'geometry', 'transform', 'material'
+
+    def __init__(self, geometry: Hittable, transform: Transform, material: Material = None) -> None:
+        self.geometry = geometry
+        self.transform = transform
+        self.material = material
+
+    def closest(self, r: Ray, t_min: float, t_max: float) -> Tuple[float, Hittable]:
+        geometry = self.geometry
+        local = self.transform.ray_to_local(r)
+        if geometry.primitive:
+            t = geometry.distance(local, t_min, t_max)
+            return None if t == math.inf else (t, InstanceHit(self, geometry))
+        found = geometry.closest(local, t_min, t_max)
+        return None if found is None else (found[0], InstanceHit(self, found[1]))
+
+    def occluded(self, r: Ray, t_min: float, t_max: float) -> bool:
+        return self.geometry.occluded(self.transform.ray_to_local(r), t_min, t_max)
+
+    def local_record(self, r: Ray, t: float, hit: "InstanceHit") -> HitRecord:
+        """Hit record of `hit` at `t` along world ray `r`, built in local space and moved back."""
+
+        rec = self.geometry.record(self.transform.ray_to_local(r), t, hit.obj)
+        rec.p = r.at(t)
+        rec.normal = self.transform.vector_to_world(rec.normal)
+        rec.mat = hit.mat
+        rec.obj = hit
+        return rec
+
+    def bounding_box(self) -> AABB:
+        return self.transform.box_to_world(self.geometry.bounding_box())
+
+class InstanceHit:
+    """What `Instance.closest` reports as the hit object: the instance and the hit inside its geometry."""
+
+    __slots__ = 'instance', 'obj'
+
+    def __init__(self, instance: Instance, obj) -> None:
+        self.instance = instance
+        self.obj = obj
+
+    @property
+    def mat(self) -> Material:
+        material = self.instance.material
+        return material if material is not None else self.obj.mat
+
+    def record(self, r: Ray, t: float, obj=None) -> HitRecord:
+        return self.instance.local_record(r, t, self)
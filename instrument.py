@@ -0,0 +1,170 @@
+import cProfile
+import json
+import time
+from collections import Counter
+from typing import Dict, List
+
+from camera import *
+from bvh import *
+
+PHASES = ("ray_generation", "intersection", "scatter", "color_write")
+
+class RenderStats:
+    """
+    Counters and phase timers of one instrumented render.
+    Assign an instance to `Camera.stats` to enable them; with `Camera.stats`
+    left as None, the render loop is untouched.
+    """
+
+    def __init__(self, profile_path: str = None) -> None:
+        self.profile_path = profile_path
+        self.reset()
+
+    def reset(self) -> None:
+        self.primary_rays = 0
+        self.secondary_rays = 0
+        self.intersection_tests = 0
+        self.material_hits: Dict[str, int] = Counter()
+        self.escaped = 0
+        self.absorbed = 0
+        self.roulette_terminated = 0
+        self.depth_exhausted = 0
+        self.depth_histogram: List[int] = []
+        self.phase_time: Dict[str, float] = {phase: 0.0 for phase in PHASES}
+        self.wall_time = 0.0
+
+    @property
+    def rays(self) -> int:
+        return self.primary_rays + self.secondary_rays
+
+    def as_dict(self) -> dict:
+        return {
+            "primary_rays": self.primary_rays,
+            "secondary_rays": self.secondary_rays,
+            "intersection_tests": self.intersection_tests,
+            "material_hits": dict(self.material_hits),
+            "paths": {
+                "escaped": self.escaped,
+                "absorbed": self.absorbed,
+                "roulette_terminated": self.roulette_terminated,
+                "depth_exhausted": self.depth_exhausted,
+            },
+            "depth_histogram": self.depth_histogram,
+            "phase_time": self.phase_time,
+            "wall_time": self.wall_time,
+            "rays_per_sec": self.rays / self.wall_time if self.wall_time else 0.0,
+        }
+
+    def save_json(self, path: str) -> None:
+        with open(path, "w") as f:
+            json.dump(self.as_dict(), f, indent=2)
+
+def _test_counter(world: Hittable):
+    """Returns a function giving the ray-object tests done so far against `world`."""
+
+    if isinstance(world, BVH):
+        start = world.stats.primitive_tests
+        return lambda queries: world.stats.primitive_tests - start
+    if isinstance(world, HittableList):
+        n = len(world.objects)
+        return lambda queries: queries * n
+    return lambda queries: queries
+
+def _trace(cam: Camera, r: Ray, world: Hittable, stats: RenderStats, clock) -> Color:
+    """Instrumented copy of `Camera.__ray_color`."""
+
+    phase_time = stats.phase_time
+    throughput = Color(1.0, 1.0, 1.0)
+    depth = cam.max_depth
+    segments = depth
+    s = active_sampler()
+
+    for bounce in range(depth):
+        if bounce > 0:
+            stats.secondary_rays += 1
+        if s is not None:
+            s.start_bounce(bounce)
+
+        t0 = clock()
+        rec = world.first_hit(r, 0.001, math.inf)
+        phase_time["intersection"] += clock() - t0
+
+        if not rec:
+            stats.escaped += 1
+            stats.depth_histogram[bounce + 1] += 1
+            return throughput * sky_color(r)
+
+        stats.material_hits[type(rec.mat).__name__] += 1
+        t0 = clock()
+        attenuation, scattered = rec.mat.scatter(r, rec)
+        phase_time["scatter"] += clock() - t0
+
+        if not scattered:
+            stats.absorbed += 1
+            segments = bounce + 1
+            break
+        throughput = throughput * attenuation
+
+        if cam.rr_min_depth is not None and bounce + 1 >= cam.rr_min_depth:
+            p = min(max(throughput.x, throughput.y, throughput.z), 0.95)
+            if sample_1d() >= p:
+                stats.roulette_terminated += 1
+                segments = bounce + 1
+                break
+            throughput /= p
+        r = scattered
+    else:
+        stats.depth_exhausted += 1
+
+    stats.depth_histogram[segments] += 1
+    return Color(0, 0, 0)
+
+def _render(cam: Camera, world: Hittable, target, stats: RenderStats) -> None:
+    clock = time.perf_counter
+    phase_time = stats.phase_time
+    queries_before = stats.primary_rays + stats.secondary_rays
+    tests = _test_counter(world)
+
+    pbar = progress_bar(cam.image_height*cam.image_width, cam.progress)
+    for v in range(cam.image_height):
+        row = []
+        for u in range(cam.image_width):
+            pixel_color = Color(0, 0, 0)
+            for i in range(cam.samples_per_pixel):
+                t0 = clock()
+                cam.start_sample(u, v, i)
+                r = cam.get_ray(u, v)
+                phase_time["ray_generation"] += clock() - t0
+                stats.primary_rays += 1
+                pixel_color += _trace(cam, r, world, stats, clock)
+
+            t0 = clock()
+            row.extend(color_to_rgb(pixel_color / cam.samples_per_pixel))
+            phase_time["color_write"] += clock() - t0
+            pbar.update(1)
+        t0 = clock()
+        write_row(target, v, row)
+        phase_time["color_write"] += clock() - t0
+    pbar.close()
+
+    stats.intersection_tests += tests(stats.primary_rays + stats.secondary_rays - queries_before)
+
+def render_instrumented(cam: Camera, world: Hittable, target, stats: RenderStats) -> None:
+    """
+    Renders like `Camera.render` while filling `stats`. When `stats.profile_path`
+    is set, the render also runs under cProfile and its stats are dumped there
+    (readable with `pstats` or snakeviz).
+    """
+
+    cam.initialize()
+    stats.reset()
+    stats.depth_histogram = [0] * (cam.max_depth + 1)
+
+    start = time.perf_counter()
+    if stats.profile_path:
+        profiler = cProfile.Profile()
+        profiler.runcall(_render, cam, world, target, stats)
+        profiler.dump_stats(stats.profile_path)
+    else:
+        _render(cam, world, target, stats)
+    stats.wall_time = time.perf_counter() - start
@@ -0,0 +1,256 @@
+"""
+Optional Numba-compiled render backend. The whole intersect/scatter/shade loop
+runs as compiled kernels over a `CompiledScene` and its flattened BVH. The
+kernels are cached on disk (`cache=True`), so only the first run pays for
+compilation. Without Numba installed, `available()` is False and `Camera`
+falls back to its pure-Python path.
+"""
+
+import numpy as np
+
+from camera import *
+from compiled_scene import *
+from framebuffer import to_rgb8
+
+try:
+    import numba
+    from numba import njit, prange
+except ImportError:
+    numba = None
+
+# Slots of the per-thread BVH traversal stack. Traversal pops one node and pushes at
+# most two, so a BVH whose longest root-to-leaf path has d nodes needs d + 1 slots.
+STACK_SIZE = 128
+
+def available() -> bool:
+    return numba is not None
+
+if numba is not None:
+
+    @njit(cache=True)
+    def _rand_unit_vector():
+        # Same distribution as `Vec3.rand_unit_vector`.
+        z = 1.0 - np.random.random()
+        phi = 2.0 * math.pi * np.random.random()
+        s = math.sqrt(1.0 - z * z)
+        return math.cos(phi) * s, math.sin(phi) * s, z
+
+    @njit(cache=True)
+    def _closest_hit(ox, oy, oz, dx, dy, dz, t_min, t_max, centers, radius_sq, bounds, nodes, prims, stack):
+        ix = 1.0 / dx if dx != 0.0 else 1e30
+        iy = 1.0 / dy if dy != 0.0 else 1e30
+        iz = 1.0 / dz if dz != 0.0 else 1e30
+        a = dx*dx + dy*dy + dz*dz
+        closest = t_max
+        best = -1
+
+        top = 0
+        stack[top] = 0
+        top += 1
+        while top > 0:
+            top -= 1
+            node = stack[top]
+
+            t0 = (bounds[node, 0] - ox) * ix; t1 = (bounds[node, 1] - ox) * ix
+            if t0 > t1: t0, t1 = t1, t0
+            lo = max(t0, t_min); hi = min(t1, closest)
+            if hi <= lo: continue
+            t0 = (bounds[node, 2] - oy) * iy; t1 = (bounds[node, 3] - oy) * iy
+            if t0 > t1: t0, t1 = t1, t0
+            lo = max(t0, lo); hi = min(t1, hi)
+            if hi <= lo: continue
+            t0 = (bounds[node, 4] - oz) * iz; t1 = (bounds[node, 5] - oz) * iz
+            if t0 > t1: t0, t1 = t1, t0
+            lo = max(t0, lo); hi = min(t1, hi)
+            if hi <= lo: continue
+
+            left = nodes[node, 0]
+            if left < 0:
+                start = nodes[node, 2]
+                for k in range(start, start + nodes[node, 3]):
+                    i = prims[k]
+                    ocx = centers[i, 0] - ox; ocy = centers[i, 1] - oy; ocz = centers[i, 2] - oz
+                    h = dx*ocx + dy*ocy + dz*ocz
+                    disc = h*h - a*(ocx*ocx + ocy*ocy + ocz*ocz - radius_sq[i])
+                    if disc < 0.0: continue
+                    sqrtd = math.sqrt(disc)
+                    root = (h - sqrtd) / a
+                    if not (t_min < root < closest):
+                        root = (h + sqrtd) / a
+                        if not (t_min < root < closest): continue
+                    closest = root
+                    best = i
+                continue
+
+            axis = nodes[node, 4]
+            d = dx if axis == 0 else (dy if axis == 1 else dz)
+            right = nodes[node, 1]
+            if d < 0.0:
+                stack[top] = left; stack[top + 1] = right
+            else:
+                stack[top] = right; stack[top + 1] = left
+            top += 2
+
+        return closest, best
+
+    @njit(cache=True)
+    def _trace(ox, oy, oz, dx, dy, dz, max_depth, rr_min_depth,
+               centers, radii, radius_sq, material, mat_type, albedo, fuzz, ior, bounds, nodes, prims, stack):
+        """Compiled counterpart of `Camera.__ray_color`."""
+
+        tr = 1.0; tg = 1.0; tb = 1.0
+        for bounce in range(max_depth):
+            t, i = _closest_hit(ox, oy, oz, dx, dy, dz, 0.001, math.inf, centers, radius_sq, bounds, nodes, prims, stack)
+            if i < 0:
+                length = math.sqrt(dx*dx + dy*dy + dz*dz)
+                a = (dy / length + 1.0) * 0.5
+                return tr * (1.0 - a + 0.5 * a), tg * (1.0 - a + 0.7 * a), tb * (1.0 - a + a)
+
+            px = ox + t * dx; py = oy + t * dy; pz = oz + t * dz
+            nx = (px - centers[i, 0]) / radii[i]; ny = (py - centers[i, 1]) / radii[i]; nz = (pz - centers[i, 2]) / radii[i]
+            front_face = dx*nx + dy*ny + dz*nz < 0.0
+            if not front_face:
+                nx = -nx; ny = -ny; nz = -nz
+
+            m = material[i]
+            kind = mat_type[m]
+            if kind == LAMBERTIAN:
+                rx, ry, rz = _rand_unit_vector()
+                sx = nx + rx; sy = ny + ry; sz = nz + rz
+                if abs(sx) < 1e-8 and abs(sy) < 1e-8 and abs(sz) < 1e-8:
+                    sx = nx; sy = ny; sz = nz
+                tr *= albedo[m, 0]; tg *= albedo[m, 1]; tb *= albedo[m, 2]
+            elif kind == METAL:
+                dn = dx*nx + dy*ny + dz*nz
+                rx, ry, rz = _rand_unit_vector()
+                f = fuzz[m]
+                sx = dx - 2.0*dn*nx + f*rx; sy = dy - 2.0*dn*ny + f*ry; sz = dz - 2.0*dn*nz + f*rz
+                if sx*nx + sy*ny + sz*nz <= 0.0:
+                    return 0.0, 0.0, 0.0
+                tr *= albedo[m, 0]; tg *= albedo[m, 1]; tb *= albedo[m, 2]
+            else:
+                ri = 1.0 / ior[m] if front_face else ior[m]
+                length = math.sqrt(dx*dx + dy*dy + dz*dz)
+                ux = dx / length; uy = dy / length; uz = dz / length
+                cos_theta = min(-(ux*nx + uy*ny + uz*nz), 1.0)
+                sin_theta = math.sqrt(1.0 - cos_theta*cos_theta)
+                r0 = (1.0 - ri) / (1.0 + ri)
+                r0 = r0 * r0
+                reflectance = r0 + (1.0 - r0) * (1.0 - cos_theta) ** 5
+                if ri * sin_theta > 1.0 or reflectance > np.random.random():
+                    un = ux*nx + uy*ny + uz*nz
+                    sx = ux - 2.0*un*nx; sy = uy - 2.0*un*ny; sz = uz - 2.0*un*nz
+                else:
+                    px_ = (ux + nx * cos_theta) * ri; py_ = (uy + ny * cos_theta) * ri; pz_ = (uz + nz * cos_theta) * ri
+                    k = -math.sqrt(abs(1.0 - (px_*px_ + py_*py_ + pz_*pz_)))
+                    sx = px_ + nx * k; sy = py_ + ny * k; sz = pz_ + nz * k
+
+            if rr_min_depth >= 0 and bounce + 1 >= rr_min_depth:
+                p = min(max(tr, tg, tb), 0.95)
+                if np.random.random() >= p:
+                    return 0.0, 0.0, 0.0
+                tr /= p; tg /= p; tb /= p
+
+            ox = px; oy = py; oz = pz
+            dx = sx; dy = sy; dz = sz
+
+        return 0.0, 0.0, 0.0
+
+    @njit(cache=True, parallel=True)
+    def _render_kernel(out, seed, spp, max_depth, rr_min_depth, frame, defocus,
+                       centers, radii, radius_sq, material, mat_type, albedo, fuzz, ior, bounds, nodes, prims):
+        height, width = out.shape[0], out.shape[1]
+        cx, cy, cz = frame[0, 0], frame[0, 1], frame[0, 2]
+
+        for v in prange(height):
+            # One seed per row: a row is always traced by a single thread, so the
+            # image only depends on `seed`, not on the thread count.
+            np.random.seed(seed + v)
+            stack = np.empty(STACK_SIZE, dtype=np.int32)
+            for u in range(width):
+                r = 0.0; g = 0.0; b = 0.0
+                for _ in range(spp):
+                    fu = u + np.random.random() - 0.5
+                    fv = v + np.random.random() - 0.5
+                    sx = frame[1, 0] + frame[2, 0] * fu + frame[3, 0] * fv
+                    sy = frame[1, 1] + frame[2, 1] * fu + frame[3, 1] * fv
+                    sz = frame[1, 2] + frame[2, 2] * fu + frame[3, 2] * fv
+
+                    ox = cx; oy = cy; oz = cz
+                    if defocus:
+                        while True:
+                            px = np.random.uniform(-1.0, 1.0)
+                            py = np.random.uniform(-1.0, 1.0)
+                            if px*px + py*py < 1.0:
+                                break
+                        ox = cx + frame[4, 0] * px + frame[5, 0] * py
+                        oy = cy + frame[4, 1] * px + frame[5, 1] * py
+                        oz = cz + frame[4, 2] * px + frame[5, 2] * py
+
+                    cr, cg, cb = _trace(ox, oy, oz, sx - ox, sy - oy, sz - oz, max_depth, rr_min_depth,
+                                        centers, radii, radius_sq, material, mat_type, albedo, fuzz, ior,
+                                        bounds, nodes, prims, stack)
+                    r += cr; g += cg; b += cb
+                out[v, u, 0] = r / spp
+                out[v, u, 1] = g / spp
+                out[v, u, 2] = b / spp
+
+def _frame(cam: Camera) -> np.ndarray:
+    """Camera geometry packed as rows: center, pixel00, delta u, delta v, defocus disk u, defocus disk v."""
+
+    return np.array([
+        tuple(cam.center), tuple(cam.pixel00_loc), tuple(cam.pixel_delta_u), tuple(cam.pixel_delta_v),
+        tuple(cam.defocus_disk_u), tuple(cam.defocus_disk_v),
+    ], dtype=np.float64)
+
+def bvh_depth(scene: CompiledScene) -> int:
+    """Number of nodes on the longest root-to-leaf path of `scene`'s flattened BVH."""
+
+    nodes = scene.bvh_nodes.tolist()
+    depth = 0
+    stack = [(0, 1)] if nodes else []
+    while stack:
+        node, d = stack.pop()
+        depth = max(depth, d)
+        left, right = nodes[node][:2]
+        if left >= 0:
+            stack.append((left, d + 1))
+            stack.append((right, d + 1))
+    return depth
+
+def prepare(world: Hittable) -> CompiledScene:
+    scene = world if isinstance(world, CompiledScene) else CompiledScene(world)
+    if scene.bvh_nodes is None:
+        scene.build_bvh()
+    depth = bvh_depth(scene)
+    if depth + 1 > STACK_SIZE:
+        raise ValueError(f"BVH is {depth} levels deep, the traversal stack holds {STACK_SIZE} nodes")
+    return scene
+
+def render_linear(cam: Camera, world: Hittable, seed: int = None) -> np.ndarray:
+    """Renders `world` and returns the averaged linear color as a (height, width, 3) float array."""
+
+    if not available():
+        raise RuntimeError("the numba backend needs the 'numba' package")
+
+    cam.initialize()
+    scene = prepare(world)
+    out = np.zeros((cam.image_height, cam.image_width, 3))
+    if len(scene) == 0:
+        return out
+
+    if seed is None:
+        seed = cam.seed if cam.seed is not None else random.getrandbits(31)
+    seed %= 2**31
+    rr_min_depth = cam.rr_min_depth if cam.rr_min_depth is not None else -1
+    _render_kernel(
+        out, seed, cam.samples_per_pixel, cam.max_depth, rr_min_depth, _frame(cam), cam.defocus_angle > 0,
+        scene.centers, scene.radii, scene.radius_sq, scene.material, scene.mat_type,
+        scene.albedo, scene.fuzz, scene.ior, scene.bvh_bounds, scene.bvh_nodes, scene.bvh_prims,
+    )
+    return out
+
+def render(cam: Camera, world: Hittable, target, seed: int = None) -> None:
+    image = to_rgb8(render_linear(cam, world, seed))
+    for v, row in enumerate(image):
+        write_row(target, v, row.ravel().tolist())
@@ -1,7 +1,7 @@
-import random
 from typing import Tuple
 
 from hittable import *
+from sampler import *
 
 class Material:
     def scatter(self, r_in: Ray, rec: HitRecord) -> Tuple[Color, Ray]:
@@ -13,7 +13,7 @@ class Lambertian(Material):
         self.albedo = albedo
     
     def scatter(self, r_in: Ray, rec: HitRecord) -> Tuple[Color, Ray]:
-        scatter_direction = rec.normal + Vec3.rand_unit_vector()
+        scatter_direction = rec.normal + sample_unit_vector()
         if scatter_direction.near_zero():
             scatter_direction = rec.normal
             
@@ -28,7 +28,7 @@ class Metal(Material):
         self.fuzz = min(fuzz, 1)
     
     def scatter(self, r_in: Ray, rec: HitRecord) -> Tuple[Color, Ray]:
-        reflected = r_in.dir.reflect(rec.normal) + Vec3.rand_unit_vector() * self.fuzz
+        reflected = r_in.dir.reflect(rec.normal) + sample_unit_vector() * self.fuzz
         
         scattered = Ray(rec.p, reflected)
         attenuation = self.albedo
@@ -50,7 +50,7 @@ class Dielectric(Material):
 
         cannot_refract = ri * sin_theta > 1.0
 
-        if cannot_refract or self.__reflectance(cos_theta, ri) > random.random():
+        if cannot_refract or self.__reflectance(cos_theta, ri) > sample_1d():
             direction = unit_direction.reflect(rec.normal)
         else: 
             direction = unit_direction.refract(rec.normal, ri)
@@ -0,0 +1,108 @@
+import multiprocessing as mp
+import random
+from typing import List, Tuple
+
+from camera import *
+
+class Tile:
+    __slots__ = 'index', 'x0', 'y0', 'x1', 'y1'
+
+    def __init__(self, index: int, x0: int, y0: int, x1: int, y1: int) -> None:
+        self.index = index
+        self.x0 = x0
+        self.y0 = y0
+        self.x1 = x1
+        self.y1 = y1
+
+    @property
+    def pixel_count(self) -> int:
+        return (self.x1 - self.x0) * (self.y1 - self.y0)
+
+    def __repr__(self) -> str:
+        return f"Tile({self.index}, ({self.x0}, {self.y0}), ({self.x1}, {self.y1}))"
+
+def make_tiles(width: int, height: int, size: int) -> List[Tile]:
+    """Splits the image into `size` x `size` tiles in scanline order."""
+
+    tiles = []
+    for y0 in range(0, height, size):
+        for x0 in range(0, width, size):
+            tiles.append(Tile(len(tiles), x0, y0, min(x0 + size, width), min(y0 + size, height)))
+    return tiles
+
+def tile_seed(seed: int, index: int) -> str:
+    """
+    Seed of one tile, derived only from the render seed and the tile index
+    so the image does not depend on which worker renders which tile.
+    """
+
+    return f"{seed}:{index}"
+
+# Per-process render state, set once per worker by `_init_worker`.
+_cam: Camera = None
+_world: Hittable = None
+_framebuffer = None
+_seed: int = None
+
+def _init_worker(cam: Camera, world: Hittable, framebuffer, seed: int) -> None:
+    global _cam, _world, _framebuffer, _seed
+    _cam = cam
+    _world = world
+    _framebuffer = framebuffer
+    _seed = seed
+    _cam.initialize(_world)
+
+def _render_tile(tile: Tile) -> Tuple[int, List[int]]:
+    """Renders `tile` into the framebuffer; returns its pixel count and its own depth histogram."""
+
+    random.seed(tile_seed(_seed, tile.index))
+    _cam.depth_histogram = [0] * (_cam.max_depth + 1)
+    if _cam.render_sampler is not None:
+        bind_sampler(_cam.render_sampler).reseed(tile_seed(_seed, tile.index))
+
+    width = _cam.image_width
+    for v in range(tile.y0, tile.y1):
+        row = []
+        for u in range(tile.x0, tile.x1):
+            row.extend(color_to_rgb(_cam.pixel_color(u, v, _world)))
+        start = (v * width + tile.x0) * 3
+        _framebuffer[start:start + len(row)] = row
+
+    return tile.pixel_count, _cam.depth_histogram
+
+def render_tiles(cam: Camera, world: Hittable, target) -> None:
+    """
+    Renders `cam` tile by tile on `cam.workers` processes into a shared framebuffer.
+    The scene is sent to each worker once; the same `cam.seed` gives the same
+    image for any worker count.
+    """
+
+    seed = cam.seed if cam.seed is not None else random.getrandbits(64)
+    cam.initialize()
+
+    width, height = cam.image_width, cam.image_height
+    framebuffer = mp.RawArray('B', width * height * 3)
+    tiles = make_tiles(width, height, cam.tile_size)
+    pbar = progress_bar(width * height, cam.progress)
+    histogram = [0] * (cam.max_depth + 1)
+
+    def add(result) -> None:
+        n, tile_histogram = result
+        for depth, count in enumerate(tile_histogram):
+            histogram[depth] += count
+        pbar.update(n)
+
+    if cam.workers <= 1:
+        _init_worker(cam, world, framebuffer, seed)
+        for tile in tiles:
+            add(_render_tile(tile))
+    else:
+        with mp.Pool(cam.workers, initializer=_init_worker, initargs=(cam, world, framebuffer, seed)) as pool:
+            for result in pool.imap_unordered(_render_tile, tiles):
+                add(result)
+    pbar.close()
+    cam.depth_histogram = histogram
+
+    row_size = width * 3
+    for v in range(height):
+        write_row(target, v, framebuffer[v * row_size:(v + 1) * row_size])
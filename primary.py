@@ -0,0 +1,119 @@
+import math
+from typing import List
+import numpy as np
+
+from camera import *
+from compiled_scene import *
+
+class PrimaryRays:
+    """
+    First hits of the primary rays of a pinhole camera (`defocus_angle` 0),
+    whose rays all start at the camera center. Per frame, every sphere's
+    center relative to the eye and its `c` term of the ray-sphere quadratic
+    are computed once, and the sphere is binned into the screen tiles its
+    projection covers. A primary ray then only tests the candidates of its
+    pixel's tile and skips the per-sphere setup.
+    """
+
+    def __init__(self, cam: Camera, world: Hittable, tile_size: int = 8) -> None:
+        self.world = world
+        self.tile_size = tile_size
+        self.tiles_x = (cam.image_width + tile_size - 1) // tile_size
+        self.tiles_y = (cam.image_height + tile_size - 1) // tile_size
+        self.tiles: List[list] = [[] for _ in range(self.tiles_x * self.tiles_y)]
+
+        eye = cam.center
+        du_len, dv_len = cam.pixel_delta_u.mag, cam.pixel_delta_v.mag
+        du, dv = cam.pixel_delta_u / du_len, cam.pixel_delta_v / dv_len
+        forward = du.cross(dv)
+        to_pixel00 = cam.pixel00_loc - eye
+        a0, b0, focus = to_pixel00.dot(du), to_pixel00.dot(dv), to_pixel00.dot(forward)
+
+        if isinstance(world, CompiledScene):
+            objects = list(range(len(world)))
+            centers, radii = world.centers, world.radii
+        else:
+            objects = flatten_spheres(world, [])
+            centers = np.array([tuple(s.center) for s in objects]).reshape(-1, 3)
+            radii = np.array([s.radius for s in objects])
+
+        # Screen-space extent of every sphere at once; spheres off screen are dropped here.
+        oc = centers - np.array(tuple(eye))
+        x, y, z = oc @ np.array(tuple(du)), oc @ np.array(tuple(dv)), oc @ np.array(tuple(forward))
+        u_lo, u_hi = self.__pixel_range(x, z, radii, focus, a0, du_len)
+        v_lo, v_hi = self.__pixel_range(y, z, radii, focus, b0, dv_len)
+        tx0, tx1 = self.__tile_range(u_lo, u_hi, self.tiles_x)
+        ty0, ty1 = self.__tile_range(v_lo, v_hi, self.tiles_y)
+        visible = (tx0 <= tx1) & (ty0 <= ty1)
+
+        for i in np.flatnonzero(visible).tolist():
+            obj = objects[i]
+            # The same terms, computed the same way, as `Sphere.distance` for rays from the eye.
+            center = obj.center if isinstance(obj, Sphere) else Point3(*centers[i].tolist())
+            radius = obj.radius if isinstance(obj, Sphere) else float(radii[i])
+            oc = center - eye
+            entry = (oc.x, oc.y, oc.z, oc.mag_sq - radius ** 2, obj)
+            for ty in range(ty0[i], ty1[i] + 1):
+                row = ty * self.tiles_x
+                for tx in range(tx0[i], tx1[i] + 1):
+                    self.tiles[row + tx].append(entry)
+
+    @staticmethod
+    def __pixel_range(x: np.ndarray, z: np.ndarray, radius: np.ndarray, focus: float, x0: float, pixel_size: float):
+        """
+        Range of pixel coordinates along one screen axis covered by spheres at
+        (x, z) in the plane of that axis and the view direction. Spheres
+        around the eye cover everything, spheres behind it get an empty range.
+        """
+
+        d = np.hypot(x, z)
+        inside = d <= radius
+        angle = np.arctan2(x, z)
+        spread = np.arcsin(np.minimum(radius / np.maximum(d, 1e-300), 1.0))
+        lo, hi = angle - spread, angle + spread
+        half_pi = np.pi / 2
+        with np.errstate(invalid="ignore", over="ignore"):
+            lo_px = np.where(lo <= -half_pi, -np.inf, (np.tan(np.clip(lo, -half_pi, half_pi)) * focus - x0) / pixel_size)
+            hi_px = np.where(hi >= half_pi, np.inf, (np.tan(np.clip(hi, -half_pi, half_pi)) * focus - x0) / pixel_size)
+        behind = (lo >= half_pi) | (hi <= -half_pi)
+        lo_px = np.where(inside, -np.inf, np.where(behind, np.inf, lo_px))
+        hi_px = np.where(inside, np.inf, np.where(behind, -np.inf, hi_px))
+        # Half a pixel of jitter either way, and as much again against rounding.
+        return lo_px - 1.0, hi_px + 1.0
+
+    def __tile_range(self, lo: np.ndarray, hi: np.ndarray, count: int):
+        """First and last tile index each range touches; first > last when it misses the screen."""
+        size = self.tile_size
+        first = np.floor(np.clip(lo, -1.0, count * size) / size).astype(int)
+        last = np.floor(np.clip(hi, -1.0, count * size) / size).astype(int)
+        return np.maximum(first, 0), np.minimum(last, count - 1)
+
+    @property
+    def mean_candidates(self) -> float:
+        """Average number of spheres a primary ray is tested against."""
+        return sum(len(t) for t in self.tiles) / len(self.tiles) if self.tiles else 0.0
+
+    def first_hit(self, r: Ray, u: int, v: int) -> HitRecord:
+        """First hit of primary ray `r` through pixel (u, v), as `world.first_hit(r, 0.001, inf)` would find it."""
+
+        size = self.tile_size
+        candidates = self.tiles[(v // size) * self.tiles_x + u // size]
+        dx, dy, dz = r.dir.x, r.dir.y, r.dir.z
+        a = dx * dx + dy * dy + dz * dz
+
+        closest = math.inf
+        best = None
+        for ocx, ocy, ocz, c, obj in candidates:
+            h = dx * ocx + dy * ocy + dz * ocz
+            discriminant = h*h - a*c
+            if discriminant < 0: continue
+
+            sqrtd = math.sqrt(discriminant)
+            root = (h - sqrtd) / a
+            if not 0.001 < root < closest:
+                root = (h + sqrtd) / a
+                if not 0.001 < root < closest: continue
+            closest = root
+            best = obj
+
+        return None if best is None else self.world.record(r, closest, best)
@@ -0,0 +1,122 @@
+import random
+from typing import Callable, Dict, List, Tuple
+
+from hittable import *
+
+class ProceduralGrid(Hittable):
+    """
+    Objects laid out on a square grid of cells in the xz plane and generated
+    on demand: the contents of cell (a, b) are `generate(rng, a, b)` with `rng`
+    seeded from `seed` and the cell alone, so the scene is the same however
+    its cells are visited while only the most recently used `cache_size`
+    cells are ever held in memory.
+
+    Cells span `a` and `b` in [-half_extent, half_extent), each `cell_size`
+    wide. Objects must lie within `y_min` <= y <= `y_max` and may stick out of
+    their cell by up to `reach` cells.
+    """
+
+    def __init__(self, generate: Callable[[random.Random, int, int], List[Hittable]], half_extent: int,
+                 seed: int = None, cell_size: float = 1.0, y_min: float = 0.0, y_max: float = 1.0,
+                 reach: int = 1, cache_size: int = 65536) -> None:
+        self.generate = generate
+        self.half_extent = half_extent
+        self.seed = seed if seed is not None else random.getrandbits(64)
+        self.cell_size = cell_size
+        self.y_min = y_min
+        self.y_max = y_max
+        self.reach = reach
+        self.cache_size = cache_size
+        self.cells_generated = 0
+        self.__cells: Dict[Tuple[int, int], List[Hittable]] = {}
+
+        lo = (-half_extent - reach) * cell_size
+        hi = (half_extent + reach) * cell_size
+        self.bbox = AABB(Interval(lo, hi), Interval(y_min, y_max), Interval(lo, hi))
+
+    @property
+    def cell_count(self) -> int:
+        return (2 * self.half_extent) ** 2
+
+    def cell(self, a: int, b: int) -> List[Hittable]:
+        """Objects of cell (a, b), generated now unless still cached."""
+
+        key = (a, b)
+        objects = self.__cells.pop(key, None)
+        if objects is None:
+            objects = self.generate(random.Random(f"{self.seed}:{a}:{b}"), a, b)
+            self.cells_generated += 1
+            if len(self.__cells) >= self.cache_size:
+                del self.__cells[next(iter(self.__cells))]
+        self.__cells[key] = objects
+        return objects
+
+    def closest(self, r: Ray, t_min: float, t_max: float) -> Tuple[float, Hittable]:
+        return self.__search(r, t_min, t_max, False)
+
+    def occluded(self, r: Ray, t_min: float, t_max: float) -> bool:
+        return self.__search(r, t_min, t_max, True) is not None
+
+    def __search(self, r: Ray, t_min: float, t_max: float, any_hit: bool) -> Tuple[float, Hittable]:
+        """Walks the cells under the ray front to back (2D DDA), testing each cell's neighbourhood."""
+
+        # Clip the ray to the grid's box.
+        t_lo, t_hi = t_min, t_max
+        for lo, hi, o, d in ((self.bbox.x.min, self.bbox.x.max, r.orig.x, r.dir.x),
+                             (self.y_min, self.y_max, r.orig.y, r.dir.y),
+                             (self.bbox.z.min, self.bbox.z.max, r.orig.z, r.dir.z)):
+            inv = 1.0 / d if d else 1e30
+            t0, t1 = (lo - o) * inv, (hi - o) * inv
+            if t0 > t1: t0, t1 = t1, t0
+            if t0 > t_lo: t_lo = t0
+            if t1 < t_hi: t_hi = t1
+            if t_hi <= t_lo: return None
+
+        size = self.cell_size
+        n, reach = self.half_extent, self.reach
+        dx, dz = r.dir.x, r.dir.z
+        x, z = (r.orig.x + dx * t_lo) / size, (r.orig.z + dz * t_lo) / size
+        a, b = math.floor(x), math.floor(z)
+        step_a = 1 if dx > 0 else -1
+        step_b = 1 if dz > 0 else -1
+        delta_a = size / abs(dx) if dx else math.inf
+        delta_b = size / abs(dz) if dz else math.inf
+        next_a = t_lo + ((a + (dx > 0)) - x) * size / dx if dx else math.inf
+        next_b = t_lo + ((b + (dz > 0)) - z) * size / dz if dz else math.inf
+
+        best = None
+        closest = t_max
+        tested = set()
+        t_cell = t_lo
+        # A hit inside this cell comes from an object of it or of a neighbour within `reach`,
+        # so nothing beyond the closest hit so far can be beaten once the walk passes it.
+        while t_cell <= t_hi and t_cell < closest:
+            for ca in range(max(a - reach, -n), min(a + reach, n - 1) + 1):
+                for cb in range(max(b - reach, -n), min(b + reach, n - 1) + 1):
+                    if (ca, cb) in tested:
+                        continue
+                    tested.add((ca, cb))
+                    for obj in self.cell(ca, cb):
+                        if obj.primitive:
+                            t = obj.distance(r, t_min, closest)
+                            if t < closest:
+                                best = obj
+                                closest = t
+                        elif found := obj.closest(r, t_min, closest):
+                            closest, best = found
+                    if any_hit and best is not None:
+                        return closest, best
+
+            if next_a < next_b:
+                a += step_a
+                t_cell = next_a
+                next_a += delta_a
+            else:
+                b += step_b
+                t_cell = next_b
+                next_b += delta_b
+
+        return None if best is None else (closest, best)
+
+    def bounding_box(self) -> AABB:
+        return self.bbox
@@ -0,0 +1,166 @@
+import math
+import os
+import time
+import numpy as np
+
+from camera import *
+from framebuffer import to_rgb8
+from denoise import luminance
+from scene_io import world_hash
+
+def camera_key(cam: Camera) -> str:
+    """Settings that must match for accumulated samples to be resumable."""
+
+    return repr((
+        cam.image_width, cam.image_height, cam.max_depth, cam.vfov,
+        tuple(cam.lookfrom), tuple(cam.lookat), tuple(cam.vup),
+        cam.defocus_angle, cam.focus_dist,
+    ))
+
+class BudgetResult:
+    """What `ProgressiveRender.run_for` achieved within its time budget."""
+
+    def __init__(self, linear: np.ndarray, samples: int, passes: int, budget: float, elapsed: float,
+                 error: np.ndarray) -> None:
+        self.linear = linear
+        self.samples = samples
+        self.passes = passes
+        self.budget = budget
+        self.elapsed = elapsed
+        self.error = error
+
+    @property
+    def noise(self) -> float:
+        """
+        Root mean square over the pixels of the standard error of their mean
+        luminance. The per-sample variance is estimated from this run's passes,
+        so the noise is infinite with fewer than two.
+        """
+        return float(np.sqrt(np.mean(self.error ** 2)))
+
+    @property
+    def overrun(self) -> float:
+        return max(0.0, self.elapsed - self.budget)
+
+    @property
+    def samples_per_sec(self) -> float:
+        height, width = self.linear.shape[:2]
+        return self.passes * width * height / self.elapsed if self.elapsed else 0.0
+
+    def image(self) -> np.ndarray:
+        return to_rgb8(self.linear)
+
+class ProgressiveRender:
+    """
+    Float accumulation buffer filled one sample per pixel per pass.
+    The buffer and its sample count can be checkpointed and resumed.
+    """
+
+    def __init__(self, cam: Camera, world: Hittable, checkpoint_path: str = None, checkpoint_every: int = 1) -> None:
+        cam.initialize(world)
+        self.cam = cam
+        self.world = world
+        self.checkpoint_path = checkpoint_path
+        self.checkpoint_every = max(1, checkpoint_every)
+        self.__world_key: str = None
+
+        self.accum = np.zeros((cam.image_height, cam.image_width, 3))
+        self.samples = 0
+
+        if checkpoint_path and os.path.exists(checkpoint_path):
+            self.load_checkpoint(checkpoint_path)
+
+    def render_pass(self) -> None:
+        cam, world = self.cam, self.world
+        for v in range(cam.image_height):
+            row = self.accum[v]
+            row += [tuple(cam.sample(u, v, world, self.samples)) for u in range(cam.image_width)]
+        self.samples += 1
+
+    def linear(self) -> np.ndarray:
+        """Mean linear color so far, (height, width, 3)."""
+        return self.accum / max(self.samples, 1)
+
+    def image(self) -> np.ndarray:
+        """Displayable uint8 image of the samples so far, (height, width, 3)."""
+        return to_rgb8(self.linear())
+
+    def run(self, passes: int):
+        """Renders `passes` more passes, yielding `(image, samples)` after each one."""
+
+        pbar = progress_bar(passes, self.cam.progress)
+        for i in range(passes):
+            self.render_pass()
+            if self.checkpoint_path and ((i + 1) % self.checkpoint_every == 0 or i + 1 == passes):
+                self.save_checkpoint(self.checkpoint_path)
+            pbar.update(1)
+            yield self.image(), self.samples
+        pbar.close()
+
+    def run_for(self, seconds: float, max_samples: int = None, start: float = None, clock=time.perf_counter) -> BudgetResult:
+        """
+        Renders passes until `seconds` after `start` (a `clock` reading, by
+        default now) are spent, or `max_samples` are reached.
+        The first pass always runs. Every further pass only starts if, at the
+        throughput measured so far, it is predicted to end by the deadline, so
+        the deadline is overrun by at most one pass.
+        """
+
+        if start is None:
+            start = clock()
+        deadline = start + seconds
+        passes = 0
+        last = 0.0
+        lum_sum = np.zeros(self.accum.shape[:2])
+        lum_sq = np.zeros(self.accum.shape[:2])
+
+        while max_samples is None or self.samples < max_samples:
+            now = clock()
+            if passes:
+                # The slower of the last pass and the mean one, so one slow pass is not forgotten at once.
+                predicted = max(last, (now - start) / passes)
+                if now + predicted > deadline:
+                    break
+            before = self.accum.copy()
+            self.render_pass()
+            lum = luminance(self.accum - before)
+            lum_sum += lum
+            lum_sq += lum * lum
+            passes += 1
+            last = clock() - now
+            if self.checkpoint_path and passes % self.checkpoint_every == 0:
+                self.save_checkpoint(self.checkpoint_path)
+
+        if self.checkpoint_path and passes % self.checkpoint_every:
+            self.save_checkpoint(self.checkpoint_path)
+
+        if passes > 1:
+            variance = np.maximum(lum_sq - lum_sum * lum_sum / passes, 0.0) / (passes - 1)
+            error = np.sqrt(variance / self.samples)
+        else:
+            error = np.full(lum_sum.shape, math.inf)
+        return BudgetResult(self.linear(), self.samples, passes, seconds, clock() - start, error)
+
+    def world_key(self) -> str:
+        """`world_hash` of the scene, which checkpoints record; computed once, on first use."""
+        if self.__world_key is None:
+            self.__world_key = world_hash(self.world)
+        return self.__world_key
+
+    def save_checkpoint(self, path: str) -> None:
+        # Write to a temporary file first so an interrupted save never corrupts the previous checkpoint.
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            np.savez(f, accum=self.accum, samples=self.samples, key=camera_key(self.cam), world=self.world_key())
+        os.replace(tmp, path)
+
+    def load_checkpoint(self, path: str) -> None:
+        with np.load(path) as data:
+            if str(data["key"]) != camera_key(self.cam):
+                raise ValueError(f"checkpoint '{path}' was rendered with different camera settings")
+            if "world" not in data or str(data["world"]) != self.world_key():
+                raise ValueError(f"checkpoint '{path}' was rendered from a different scene")
+            if data["accum"].shape != self.accum.shape:
+                raise ValueError(f"checkpoint '{path}' has shape {data['accum'].shape}, expected {self.accum.shape}")
+            self.accum = data["accum"].copy()
+            self.samples = int(data["samples"])
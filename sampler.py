@@ -0,0 +1,261 @@
+"""
+Samplers that supply the random numbers of the Python render path.
+
+A sample of pixel (u, v) consumes its numbers as dimensions: 0-1 jitter the
+pixel position, 2-3 pick the lens point, and each bounce then starts a fresh
+group of `BOUNCE_DIMENSIONS`. Materials and Russian roulette read them through
+`sample_1d` / `sample_unit_vector`, which fall back to the global `random`
+module when no sampler is active, so renders without one are unchanged.
+
+Samplers draw their independent numbers in blocks from a per-thread numpy
+generator; `bind_sampler` hands every thread its own copy of the camera's sampler.
+"""
+
+import hashlib
+import itertools
+import math
+import random
+import threading
+from typing import List, Tuple
+import numpy as np
+
+from vec3 import *
+
+PIXEL_DIMENSIONS = 2
+LENS_DIMENSIONS = 2
+BOUNCE_DIMENSIONS = 4
+FIRST_BOUNCE_DIMENSION = PIXEL_DIMENSIONS + LENS_DIMENSIONS
+
+def _seed_int(seed) -> int:
+    """Any hashable seed (ints, or strings like `parallel.tile_seed`) as a generator seed."""
+    if isinstance(seed, int):
+        return seed & ((1 << 128) - 1)
+    return int.from_bytes(hashlib.sha256(str(seed).encode()).digest()[:16], "little")
+
+class Sampler:
+    """
+    Base sampler: independent uniform numbers drawn in blocks.
+    Subclasses override `_value` to serve low-discrepancy dimensions.
+    """
+
+    BLOCK_SIZE = 4096
+
+    def __init__(self, samples_per_pixel: int = 1, seed: int = None, stream: int = 0) -> None:
+        self.samples_per_pixel = max(1, samples_per_pixel)
+        self.seed = seed if seed is not None else random.getrandbits(64)
+        self.reseed((self.seed, stream))
+
+    def reseed(self, seed) -> None:
+        """Restarts the independent stream, e.g. at the start of a tile."""
+        self._rng = np.random.default_rng(_seed_int(seed))
+        self._block: List[float] = []
+        self._pos = 0
+        self._pixel = None
+        self._index = 0
+        self._dim = 0
+
+    def clone(self, stream: int) -> "Sampler":
+        """Same kind and seed, with its own independent stream numbered `stream`."""
+        return type(self)(self.samples_per_pixel, self.seed, stream)
+
+    def start_sample(self, u: int, v: int, index: int) -> None:
+        """Begins sample `index` of pixel (u, v) at dimension 0."""
+        if self._pixel != (u, v):
+            self._pixel = (u, v)
+            self._start_pixel(u, v)
+        self._index = index
+        self._dim = 0
+
+    def start_bounce(self, bounce: int) -> None:
+        """Moves to the dimensions reserved for `bounce`, whatever the earlier bounces used."""
+        self._dim = FIRST_BOUNCE_DIMENSION + BOUNCE_DIMENSIONS * bounce
+
+    def next_1d(self) -> float:
+        d = self._dim
+        self._dim = d + 1
+        return self._value(d)
+
+    def next_2d(self) -> Tuple[float, float]:
+        d = self._dim
+        self._dim = d + 2
+        return self._value_2d(d)
+
+    def uniform(self) -> float:
+        """Next number of the independent block stream."""
+        pos = self._pos
+        if pos == len(self._block):
+            self._block = self._rng.random(self.BLOCK_SIZE).tolist()
+            pos = 0
+        self._pos = pos + 1
+        return self._block[pos]
+
+    def _start_pixel(self, u: int, v: int) -> None:
+        pass
+
+    def _value(self, dim: int) -> float:
+        return self.uniform()
+
+    def _value_2d(self, dim: int) -> Tuple[float, float]:
+        return self._value(dim), self._value(dim + 1)
+
+class IndependentSampler(Sampler):
+    """Uniform random numbers, like the global `random` module but drawn in blocks."""
+
+class StratifiedSampler(Sampler):
+    """
+    Jittered sampling: for each of the first `MAX_DIMENSIONS` dimensions, the
+    `samples_per_pixel` samples of a pixel fall in distinct strata, randomly
+    paired up across dimensions. Pairs of dimensions read with `next_2d` are
+    stratified jointly on a 2D grid. Samples past `samples_per_pixel` and
+    dimensions past `MAX_DIMENSIONS` are independent.
+    """
+
+    MAX_DIMENSIONS = FIRST_BOUNCE_DIMENSION + BOUNCE_DIMENSIONS * 4
+
+    def _start_pixel(self, u: int, v: int) -> None:
+        # Seeded by the pixel, so revisiting it (progressive or adaptive rendering)
+        # continues the same strata.
+        rng = np.random.default_rng([_seed_int(self.seed), u, v])
+        n = self.samples_per_pixel
+        dims = self.MAX_DIMENSIONS
+
+        strata = np.argsort(rng.random((dims, n)), axis=1)
+        self._table = ((strata + rng.random((dims, n))) / n).tolist()
+
+        nx = math.ceil(math.sqrt(n))
+        ny = math.ceil(n / nx)
+        cells = np.argsort(rng.random((dims // 2, nx * ny)), axis=1)[:, :n]
+        jitter = rng.random((2, dims // 2, n))
+        self._table_x = ((cells % nx + jitter[0]) / nx).tolist()
+        self._table_y = ((cells // nx + jitter[1]) / ny).tolist()
+
+    def _value(self, dim: int) -> float:
+        if dim < self.MAX_DIMENSIONS and self._index < self.samples_per_pixel:
+            return self._table[dim][self._index]
+        return self.uniform()
+
+    def _value_2d(self, dim: int) -> Tuple[float, float]:
+        if dim + 1 < self.MAX_DIMENSIONS and self._index < self.samples_per_pixel:
+            pair, i = dim // 2, self._index
+            if dim % 2 == 0:
+                return self._table_x[pair][i], self._table_y[pair][i]
+        return self._value(dim), self._value(dim + 1)
+
+def _primes(count: int) -> List[int]:
+    primes = []
+    for n in itertools.count(2):
+        if all(n % p for p in primes if p * p <= n):
+            primes.append(n)
+            if len(primes) == count:
+                return primes
+
+class HaltonSampler(Sampler):
+    """
+    Halton sequence over the first `MAX_DIMENSIONS` dimensions, one prime base
+    each, scrambled with random digit permutations per dimension and shifted
+    by a random per-pixel offset (Cranley-Patterson rotation) so neighbouring
+    pixels do not share a pattern. The sequence is open-ended, so it keeps
+    stratifying past `samples_per_pixel`. Later dimensions are independent.
+    """
+
+    MAX_DIMENSIONS = 32
+    PRIMES = _primes(MAX_DIMENSIONS)
+
+    def __init__(self, samples_per_pixel: int = 1, seed: int = None, stream: int = 0) -> None:
+        super().__init__(samples_per_pixel, seed, stream)
+        # Permutations come from `seed` rather than the stream, so every
+        # thread and tile sees the same scrambled sequence.
+        rng = np.random.default_rng(_seed_int((self.seed, "halton")))
+        self._perms = [rng.permutation(b).tolist() for b in self.PRIMES]
+
+    def _start_pixel(self, u: int, v: int) -> None:
+        rng = np.random.default_rng([_seed_int(self.seed), u, v])
+        self._shift = rng.random(self.MAX_DIMENSIONS).tolist()
+
+    def _value(self, dim: int) -> float:
+        if dim >= self.MAX_DIMENSIONS:
+            return self.uniform()
+
+        base, perm = self.PRIMES[dim], self._perms[dim]
+        inv_base = 1.0 / base
+        f = inv_base
+        r = 0.0
+        index = self._index
+        while index:
+            index, digit = divmod(index, base)
+            r += perm[digit] * f
+            f *= inv_base
+        # The infinitely many leading zero digits are permuted too.
+        r += perm[0] * f / (1.0 - inv_base)
+
+        r += self._shift[dim]
+        return r - 1.0 if r >= 1.0 else r
+
+SAMPLERS = {
+    "independent": IndependentSampler,
+    "stratified": StratifiedSampler,
+    "halton": HaltonSampler,
+}
+
+def make_sampler(name: str, samples_per_pixel: int, seed: int = None) -> Sampler:
+    if name not in SAMPLERS:
+        raise ValueError(f"unknown sampler '{name}', expected one of {', '.join(SAMPLERS)}")
+    return SAMPLERS[name](samples_per_pixel, seed)
+
+_local = threading.local()
+_stream_counter = itertools.count()
+
+def bind_sampler(sampler: Sampler) -> Sampler:
+    """
+    Makes this thread's copy of `sampler` the active one and returns it. The
+    main thread uses `sampler` itself; other threads get clones with their
+    own streams.
+    """
+
+    bound = getattr(_local, "bound", None)
+    if bound is None or bound[0] is not sampler:
+        if threading.current_thread() is threading.main_thread():
+            own = sampler
+        else:
+            own = sampler.clone(next(_stream_counter) + 1)
+        bound = _local.bound = (sampler, own)
+    _local.active = bound[1]
+    return bound[1]
+
+def unbind_sampler() -> None:
+    _local.active = None
+
+def active_sampler() -> Sampler:
+    return getattr(_local, "active", None)
+
+def sample_1d() -> float:
+    s = getattr(_local, "active", None)
+    if s is None:
+        return random.random()
+    return s.next_1d()
+
+def sample_unit_vector() -> Vec3:
+    """Same distribution as `Vec3.rand_unit_vector`, from the next two dimensions."""
+
+    s = getattr(_local, "active", None)
+    if s is None:
+        return Vec3.rand_unit_vector()
+    z1, z2 = s.next_2d()
+    z = 1 - z1
+    phi = 2 * math.pi * z2
+    r = math.sqrt(max(0.0, 1 - z * z))
+    return Vec3(math.cos(phi) * r, math.sin(phi) * r, z)
+
+def sample_unit_disk(s: Sampler) -> Vec3:
+    """Uniform point in the unit disk (concentric mapping, no rejection loop)."""
+
+    a, b = s.next_2d()
+    a = 2 * a - 1
+    b = 2 * b - 1
+    if a == 0 and b == 0:
+        return Vec3(0, 0, 0)
+    if abs(a) > abs(b):
+        r, theta = a, (math.pi / 4) * (b / a)
+    else:
+        r, theta = b, (math.pi / 2) - (math.pi / 4) * (a / b)
+    return Vec3(r * math.cos(theta), r * math.sin(theta), 0)
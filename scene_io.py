@@ -0,0 +1,199 @@
+"""
+Scene files: a human-editable JSON form and a compact binary (.npz) form
+holding the same spheres, materials and camera settings.
+
+    {
+      "camera": {"image_width": 400, "lookfrom": [13, 2, 3], ...},
+      "materials": [{"type": "lambertian", "albedo": [0.5, 0.5, 0.5]},
+                    {"type": "metal", "albedo": [0.7, 0.6, 0.5], "fuzz": 0.0},
+                    {"type": "dielectric", "refraction_index": 1.5}],
+      "spheres": [{"center": [0, -1000, 0], "radius": 1000, "material": 0}]
+    }
+
+`load_scene` can keep the processed world (packed arrays plus a flattened BVH)
+in an on-disk cache keyed by a hash of the file contents, so repeat loads skip
+parsing and building.
+"""
+
+import hashlib
+import json
+import os
+from typing import Tuple
+import numpy as np
+
+from compiled_scene import *
+from camera import *
+
+CACHE_VERSION = 1
+
+CAMERA_FIELDS = ("aspect_ratio", "image_width", "fixed_height", "samples_per_pixel", "max_depth", "vfov", "defocus_angle", "focus_dist")
+CAMERA_VECTORS = ("lookfrom", "lookat", "vup")
+
+def camera_to_dict(cam: Camera) -> dict:
+    d = {name: getattr(cam, name) for name in CAMERA_FIELDS}
+    d.update({name: list(getattr(cam, name)) for name in CAMERA_VECTORS})
+    return d
+
+def camera_from_dict(d: dict) -> Camera:
+    cam = Camera()
+    for name in CAMERA_FIELDS:
+        if name in d:
+            setattr(cam, name, d[name])
+    for name in CAMERA_VECTORS:
+        if name in d:
+            setattr(cam, name, Vec3(*d[name]))
+    return cam
+
+def _material_to_dict(scene: CompiledScene, i: int) -> dict:
+    kind = int(scene.mat_type[i])
+    if kind == LAMBERTIAN:
+        return {"type": "lambertian", "albedo": scene.albedo[i].tolist()}
+    if kind == METAL:
+        return {"type": "metal", "albedo": scene.albedo[i].tolist(), "fuzz": float(scene.fuzz[i])}
+    return {"type": "dielectric", "refraction_index": float(scene.ior[i])}
+
+def _material_from_dict(d: dict) -> Material:
+    kind = d.get("type")
+    if kind == "lambertian":
+        return Lambertian(Color(*d["albedo"]))
+    if kind == "metal":
+        return Metal(Color(*d["albedo"]), d.get("fuzz", 0.0))
+    if kind == "dielectric":
+        return Dielectric(d["refraction_index"])
+    raise ValueError(f"unknown material type '{kind}'")
+
+def scene_to_dict(world: Hittable, cam: Camera = None) -> dict:
+    scene = world if isinstance(world, CompiledScene) else CompiledScene(world)
+    d = {
+        "materials": [_material_to_dict(scene, i) for i in range(len(scene.mat_type))],
+        "spheres": [
+            {"center": scene.centers[i].tolist(), "radius": float(scene.radii[i]), "material": int(scene.material[i])}
+            for i in range(len(scene))
+        ],
+    }
+    if cam is not None:
+        d["camera"] = camera_to_dict(cam)
+    return d
+
+def scene_from_dict(d: dict) -> Tuple[HittableList, Camera]:
+    materials = [_material_from_dict(m) for m in d.get("materials", [])]
+    world = HittableList()
+    for s in d.get("spheres", []):
+        world.add(Sphere(Point3(*s["center"]), s["radius"], materials[s["material"]]))
+    cam = camera_from_dict(d["camera"]) if "camera" in d else None
+    return world, cam
+
+def _material_key(mat: Material) -> tuple:
+    if mat is None:
+        return None
+    return (type(mat).__name__,) + tuple(
+        (name, tuple(value) if isinstance(value, Vec3) else value) for name, value in sorted(vars(mat).items()))
+
+def _structure_key(world: Hittable) -> tuple:
+    """Content of a world that does not compile, with instances and procedural grids kept as such."""
+
+    from instance import Instance
+    from procedural import ProceduralGrid
+
+    if isinstance(world, Sphere):
+        return ("sphere", tuple(world.center), world.radius, _material_key(world.mat))
+    if isinstance(world, HittableList):
+        return ("group",) + tuple(_structure_key(obj) for obj in world.objects)
+    if isinstance(world, BVH):
+        children = []
+        stack = [world.root] if world.root else []
+        while stack:
+            node = stack.pop()
+            if node.objects is not None:
+                children.extend(_structure_key(obj) for obj in node.objects)
+            else:
+                stack.append(node.right)
+                stack.append(node.left)
+        return ("group",) + tuple(children)
+    if isinstance(world, Instance):
+        t = world.transform
+        material = _material_key(world.material)
+        return ("instance", tuple(t.offset), t.scale, t.cos, t.sin, material, _structure_key(world.geometry))
+    if isinstance(world, ProceduralGrid):
+        generate = f"{world.generate.__module__}.{world.generate.__qualname__}"
+        return ("grid", generate, world.seed, world.half_extent, world.cell_size, world.y_min, world.y_max, world.reach)
+    if isinstance(world, CompiledScene):
+        return ("compiled", world_hash(world))
+    raise TypeError(f"cannot hash {type(world).__name__} objects")
+
+def world_hash(world: Hittable) -> str:
+    """
+    Hash of the geometry and materials of `world`, the same in every process.
+    Worlds that compile hash their packed arrays, others their structure.
+    """
+
+    h = hashlib.sha256()
+    try:
+        scene = world if isinstance(world, CompiledScene) else CompiledScene(world)
+    except TypeError:
+        h.update(repr(_structure_key(world)).encode())
+    else:
+        for name in ARRAY_FIELDS:
+            h.update(np.ascontiguousarray(getattr(scene, name)).tobytes())
+    return h.hexdigest()
+
+def _save_arrays(path: str, scene: CompiledScene, cam: Camera, compress: bool) -> None:
+    save = np.savez_compressed if compress else np.savez
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        save(f, camera=json.dumps(camera_to_dict(cam) if cam is not None else None), **scene.to_arrays())
+    os.replace(tmp, path)
+
+def _load_arrays(path: str) -> Tuple[CompiledScene, Camera]:
+    with np.load(path) as data:
+        scene = CompiledScene.from_arrays(data)
+        cam = json.loads(str(data["camera"]))
+    return scene, camera_from_dict(cam) if cam is not None else None
+
+def save_scene(path: str, world: Hittable, cam: Camera = None) -> None:
+    """Writes a .json or binary .npz scene file, chosen by the extension of `path`."""
+
+    if path.endswith(".npz"):
+        scene = world if isinstance(world, CompiledScene) else CompiledScene(world)
+        _save_arrays(path, scene, cam, compress=True)
+    else:
+        with open(path, "w") as f:
+            json.dump(scene_to_dict(world, cam), f)
+
+def load_scene(path: str, cache_dir: str = None, bvh: bool = True) -> Tuple[Hittable, Camera]:
+    """
+    Loads a scene file, returning `(world, camera)`; `camera` is None if the file has none.
+
+    JSON scenes load as a `HittableList` and binary ones as a `CompiledScene`. With
+    `bvh`, the world is compiled and given a flattened BVH. With `cache_dir`, that
+    processed world is stored there as uncompressed arrays under a hash of the file
+    contents, and reloaded from there as long as the file is unchanged.
+    """
+
+    with open(path, "rb") as f:
+        data = f.read()
+
+    cache_path = None
+    if cache_dir is not None:
+        key = hashlib.sha256(data + f"|v{CACHE_VERSION}|bvh={bvh}".encode()).hexdigest()
+        cache_path = os.path.join(cache_dir, key + ".npz")
+        if os.path.exists(cache_path):
+            try:
+                return _load_arrays(cache_path)
+            except (OSError, ValueError, KeyError):
+                pass
+
+    if path.endswith(".npz"):
+        world, cam = _load_arrays(path)
+    else:
+        world, cam = scene_from_dict(json.loads(data))
+
+    if bvh or cache_path is not None:
+        world = world if isinstance(world, CompiledScene) else CompiledScene(world)
+    if bvh and world.bvh_nodes is None:
+        world.build_bvh()
+
+    if cache_path is not None:
+        os.makedirs(cache_dir, exist_ok=True)
+        _save_arrays(cache_path, world, cam, compress=False)
+    return world, cam
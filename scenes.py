@@ -0,0 +1,129 @@
+import math
+import random
+from typing import List, Tuple
+
+from hittable_list import *
+from sphere import *
+from camera import *
+from material import *
+from instance import *
+from procedural import *
+
+def _grid_cell(rng: random.Random, a: int, b: int) -> Tuple[Point3, Material]:
+    """Center and material of the small sphere in grid cell (a, b), or None if the cell is left empty."""
+
+    choose_mat = rng.random()
+    center = Point3(a + 0.9*rng.random(), 0.2, b + 0.9*rng.random())
+
+    if center.distance(Point3(4, 0.2, 0)) <= 0.9:
+        return None
+    if choose_mat < 0.8:
+        albedo = Color(rng.random(), rng.random(), rng.random()) * Color(rng.random(), rng.random(), rng.random())
+        return center, Lambertian(albedo)
+    if choose_mat < 0.95:
+        albedo = Color(rng.uniform(0.5, 1), rng.uniform(0.5, 1), rng.uniform(0.5, 1))
+        fuzz = rng.uniform(0, 0.5)
+        return center, Metal(albedo, fuzz)
+    return center, Dielectric(1.5)
+
+def _random_sphere_grid(world: HittableList, rng: random.Random, half_extent: int) -> None:
+    for a in range(-half_extent, half_extent):
+        for b in range(-half_extent, half_extent):
+            if cell := _grid_cell(rng, a, b):
+                center, sphere_material = cell
+                world.add(Sphere(center, 0.2, sphere_material))
+
+def _add_big_spheres(world: HittableList) -> None:
+    material1 = Dielectric(1.5)
+    world.add(Sphere(Point3(0, 1, 0), 1.0, material1))
+
+    material2 = Lambertian(Color(0.4, 0.2, 0.1))
+    world.add(Sphere(Point3(-4, 1, 0), 1.0, material2))
+
+    material3 = Metal(Color(0.7, 0.6, 0.5), 0.0)
+    world.add(Sphere(Point3(4, 1, 0), 1.0, material3))
+
+def final_scene(seed: int = None) -> HittableList:
+    """The book's final scene. A fixed `seed` always builds the same world."""
+
+    rng = random.Random(seed)
+    world = HittableList()
+
+    ground_material = Lambertian(Color(0.5, 0.5, 0.5))
+    world.add(Sphere(Point3(0,-1000,0), 1000, ground_material))
+
+    _random_sphere_grid(world, rng, 11)
+    _add_big_spheres(world)
+    return world
+
+def few_spheres_scene() -> HittableList:
+    """Ground plus the three large spheres of the final scene."""
+
+    world = HittableList()
+    world.add(Sphere(Point3(0,-1000,0), 1000, Lambertian(Color(0.5, 0.5, 0.5))))
+    _add_big_spheres(world)
+    return world
+
+def scaled_scene(count: int = 10000, seed: int = None) -> HittableList:
+    """The final scene with the grid of small spheres widened to roughly `count` spheres."""
+
+    rng = random.Random(seed)
+    world = HittableList()
+    world.add(Sphere(Point3(0,-1000,0), 1000, Lambertian(Color(0.5, 0.5, 0.5))))
+
+    _random_sphere_grid(world, rng, max(1, math.ceil(math.sqrt(count) / 2)))
+    _add_big_spheres(world)
+    return world
+
+def instanced_scene(seed: int = None) -> HittableList:
+    """
+    The final scene with every small sphere an `Instance` of one shared unit
+    sphere, moved and scaled into place, with the sphere's own material.
+    """
+
+    rng = random.Random(seed)
+    world = HittableList()
+    world.add(Sphere(Point3(0,-1000,0), 1000, Lambertian(Color(0.5, 0.5, 0.5))))
+
+    unit_sphere = Sphere(Point3(0, 0, 0), 1.0, None)
+    for a in range(-11, 11):
+        for b in range(-11, 11):
+            if cell := _grid_cell(rng, a, b):
+                center, sphere_material = cell
+                world.add(Instance(unit_sphere, Transform(center, 0.2), sphere_material))
+    _add_big_spheres(world)
+    return world
+
+def procedural_scene(half_extent: int = 1000, seed: int = None) -> HittableList:
+    """
+    The final scene with its grid of small spheres widened to (2 * `half_extent`)^2
+    cells (four million spheres by default) that are generated only when a ray
+    comes near them.
+    """
+
+    def generate(rng: random.Random, a: int, b: int) -> List[Hittable]:
+        cell = _grid_cell(rng, a, b)
+        return [Sphere(cell[0], 0.2, cell[1])] if cell else []
+
+    world = HittableList()
+    world.add(Sphere(Point3(0,-1000,0), 1000, Lambertian(Color(0.5, 0.5, 0.5))))
+    world.add(ProceduralGrid(generate, half_extent, seed, y_min=0.0, y_max=0.4))
+    _add_big_spheres(world)
+    return world
+
+def final_camera(image_width: int = 400, samples_per_pixel: int = 100, max_depth: int = 50) -> Camera:
+    cam = Camera()
+
+    cam.aspect_ratio      = 16.0 / 9.0
+    cam.image_width       = image_width
+    cam.samples_per_pixel = samples_per_pixel
+    cam.max_depth         = max_depth
+
+    cam.vfov     = 20
+    cam.lookfrom = Point3(13,2,3)
+    cam.lookat   = Point3(0,0,0)
+    cam.vup      = Vec3(0,1,0)
+
+    cam.defocus_angle = 0.6
+    cam.focus_dist    = 10.0
+    return cam
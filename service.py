@@ -0,0 +1,325 @@
+"""
+Long-running render service: a small HTTP API over an asyncio job queue and a
+pool of warm worker processes.
+
+    python service.py --port 8000 --workers 4
+
+    POST /jobs               {"scene": {...scene_io dict...}, "camera": {...}, "samples_per_pixel": 50, "seed": 0}
+                             -> {"id": ..., "status": "queued" | "running" | "done", ...}
+    GET  /jobs               all known jobs
+    GET  /jobs/<id>          status and progress (rows done / rows total)
+    GET  /jobs/<id>/image    the finished PNG (202 while still rendering)
+
+A job's id is a hash of its scene and render parameters, so a duplicate
+request joins the existing job and a repeated one is answered from the image
+cache on disk without rendering. Workers keep recently used scenes compiled,
+with their BVH, between jobs.
+"""
+
+import argparse
+import asyncio
+import concurrent.futures
+import hashlib
+import json
+import multiprocessing as mp
+import os
+import random
+import signal
+import threading
+import time
+from typing import Dict, Tuple
+
+from scene_io import *
+from framebuffer import PNGWriter
+
+SERVICE_VERSION = 1
+
+RENDER_PARAMS = ("samples_per_pixel", "max_depth", "image_width", "aspect_ratio")
+
+# Camera settings that must be positive; `fixed_height` may also be None.
+POSITIVE_PARAMS = {"image_width": int, "aspect_ratio": (int, float), "samples_per_pixel": int,
+                   "max_depth": int, "fixed_height": int}
+
+def normalize_request(request: dict) -> dict:
+    """
+    Canonical form of a job request: the scene's spheres and materials, the full
+    camera settings (scene camera, then `camera` overrides, then top-level render
+    parameters), the seed and the backend.
+    """
+
+    if not isinstance(request, dict):
+        raise ValueError("request must be a JSON object")
+    if "scene" not in request:
+        raise ValueError("request has no 'scene'")
+    scene = request["scene"]
+    if not isinstance(scene, dict):
+        raise ValueError("'scene' must be a JSON object")
+    for name, value in (("scene.camera", scene.get("camera", {})), ("camera", request.get("camera", {}))):
+        if not isinstance(value, dict):
+            raise ValueError(f"'{name}' must be a JSON object")
+    for name in ("materials", "spheres"):
+        if not isinstance(scene.get(name, []), list):
+            raise ValueError(f"'scene.{name}' must be a JSON list")
+    camera = camera_to_dict(Camera())
+    camera.update(scene.get("camera", {}))
+    camera.update(request.get("camera", {}))
+    camera.update({name: request[name] for name in RENDER_PARAMS if name in request})
+    for name, types in POSITIVE_PARAMS.items():
+        value = camera.get(name)
+        if name == "fixed_height" and value is None:
+            continue
+        if isinstance(value, bool) or not isinstance(value, types) or not value > 0:
+            kind = "integer" if types is int else "number"
+            raise ValueError(f"'{name}' must be a positive {kind}, got {value!r}")
+    backend = request.get("backend", "python")
+    if backend not in ("python", "numpy", "numba"):
+        raise ValueError(f"unknown backend '{backend}'")
+    return {
+        "scene": {"materials": scene.get("materials", []), "spheres": scene.get("spheres", [])},
+        "camera": camera,
+        "seed": int(request.get("seed", 0)),
+        "backend": backend,
+    }
+
+def job_id(job: dict) -> str:
+    data = json.dumps(job, sort_keys=True) + f"|v{SERVICE_VERSION}"
+    return hashlib.sha256(data.encode()).hexdigest()[:32]
+
+class Job:
+    def __init__(self, id: str, request: dict, path: str) -> None:
+        self.id = id
+        self.request = request
+        self.path = path
+        self.status = "queued"
+        self.rows_done = 0
+        self.rows_total = camera_from_dict(request["camera"]).image_height
+        self.submitted = time.time()
+        self.started: float = None
+        self.finished: float = None
+        self.error: str = None
+        self.done = asyncio.Event()
+
+    def as_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "status": self.status,
+            "rows_done": self.rows_done,
+            "rows_total": self.rows_total,
+            "progress": self.rows_done / self.rows_total if self.rows_total else 1.0,
+            "queued_seconds": (self.started or time.time()) - self.submitted,
+            "render_seconds": (self.finished or time.time()) - self.started if self.started else None,
+            "error": self.error,
+        }
+
+# Per-process worker state, set by `_init_worker`.
+_progress: mp.Queue = None
+_scenes: Dict[str, CompiledScene] = {}
+SCENE_CACHE_SIZE = 8
+
+def _init_worker(progress: mp.Queue) -> None:
+    global _progress
+    _progress = progress
+
+def _warm_scene(scene: dict) -> CompiledScene:
+    key = hashlib.sha256(json.dumps(scene, sort_keys=True).encode()).hexdigest()
+    world = _scenes.pop(key, None)
+    if world is None:
+        world = CompiledScene(scene_from_dict(scene)[0])
+        world.build_bvh()
+        if len(_scenes) >= SCENE_CACHE_SIZE:
+            del _scenes[next(iter(_scenes))]
+    _scenes[key] = world
+    return world
+
+class _ProgressWriter(PNGWriter):
+    """PNG writer that also reports every finished row to the service."""
+
+    def __init__(self, path: str, width: int, height: int, id: str) -> None:
+        super().__init__(path, width, height)
+        self.id = id
+
+    def write_row(self, v: int, row) -> None:
+        super().write_row(v, row)
+        if _progress is not None:
+            _progress.put((self.id, self.next_row, self.height))
+
+def _render_job(id: str, job: dict, path: str) -> float:
+    start = time.perf_counter()
+    world = _warm_scene(job["scene"])
+    cam = camera_from_dict(job["camera"])
+    cam.backend = job["backend"]
+    if cam.backend == "python":
+        # The serial path draws from the global generator, so seeding it makes the job
+        # reproducible while rows still stream in (and report progress) one by one.
+        random.seed(job["seed"])
+    else:
+        cam.seed = job["seed"]
+
+    tmp = path + f".{os.getpid()}.tmp"
+    with _ProgressWriter(tmp, cam.image_width, cam.image_height, id) as writer:
+        cam.render(world, writer)
+    os.replace(tmp, path)
+    return time.perf_counter() - start
+
+class RenderService:
+    """Job queue, worker pool and image cache behind the HTTP API."""
+
+    def __init__(self, workers: int = 2, cache_dir: str = ".render_cache") -> None:
+        self.workers = max(1, workers)
+        self.cache_dir = cache_dir
+        self.jobs: Dict[str, Job] = {}
+        self.cache_hits = 0
+        self.queue: asyncio.Queue = None
+        self.pool: concurrent.futures.ProcessPoolExecutor = None
+
+    async def start(self) -> None:
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue()
+        # Spawned rather than forked, so workers never inherit the listening socket.
+        context = mp.get_context("spawn")
+        self.progress = context.Queue()
+        self.pool = concurrent.futures.ProcessPoolExecutor(
+            self.workers, mp_context=context, initializer=_init_worker, initargs=(self.progress,))
+        self.__dispatchers = [asyncio.create_task(self.__dispatch()) for _ in range(self.workers)]
+        self.__progress_thread = threading.Thread(target=self.__read_progress, daemon=True)
+        self.__progress_thread.start()
+
+    async def stop(self) -> None:
+        for task in self.__dispatchers:
+            task.cancel()
+        self.progress.put(None)
+        self.pool.shutdown(cancel_futures=True)
+
+    def submit(self, request: dict) -> Job:
+        """Queues a render, or returns the existing job for an identical request."""
+
+        job = normalize_request(request)
+        id = job_id(job)
+        if id in self.jobs and self.jobs[id].status != "failed":
+            if self.jobs[id].status == "done":
+                self.cache_hits += 1
+            return self.jobs[id]
+
+        entry = Job(id, job, os.path.join(self.cache_dir, id + ".png"))
+        self.jobs[id] = entry
+        if os.path.exists(entry.path):
+            self.cache_hits += 1
+            entry.status = "done"
+            entry.rows_done = entry.rows_total
+            entry.started = entry.finished = entry.submitted
+            entry.done.set()
+        else:
+            self.queue.put_nowait(entry)
+        return entry
+
+    async def __dispatch(self) -> None:
+        while True:
+            job = await self.queue.get()
+            job.status = "running"
+            job.started = time.time()
+            try:
+                await self.loop.run_in_executor(self.pool, _render_job, job.id, job.request, job.path)
+                job.status = "done"
+                job.rows_done = job.rows_total
+            except Exception as e:
+                job.status = "failed"
+                job.error = f"{type(e).__name__}: {e}"
+            job.finished = time.time()
+            job.done.set()
+
+    def __read_progress(self) -> None:
+        while (item := self.progress.get()) is not None:
+            self.loop.call_soon_threadsafe(self.__update_progress, *item)
+
+    def __update_progress(self, id: str, rows_done: int, rows_total: int) -> None:
+        job = self.jobs.get(id)
+        if job is not None and job.status == "running":
+            job.rows_done, job.rows_total = rows_done, rows_total
+
+    async def handle(self, method: str, path: str, body: bytes) -> Tuple[int, str, bytes]:
+        """Routes one request; returns (status, content type, body)."""
+
+        parts = [p for p in path.split("?")[0].split("/") if p]
+        if parts == ["jobs"] and method == "POST":
+            try:
+                job = self.submit(json.loads(body or b"{}"))
+            except (ValueError, KeyError, TypeError) as e:
+                return _json(400, {"error": str(e)})
+            except Exception as e:
+                return _json(500, {"error": f"{type(e).__name__}: {e}"})
+            return _json(200 if job.status == "done" else 202, job.as_dict())
+        if parts == ["jobs"] and method == "GET":
+            return _json(200, {"jobs": [job.as_dict() for job in self.jobs.values()], "cache_hits": self.cache_hits})
+        if len(parts) >= 2 and parts[0] == "jobs" and method == "GET":
+            job = self.jobs.get(parts[1])
+            if job is None:
+                return _json(404, {"error": f"no job '{parts[1]}'"})
+            if parts[2:] == []:
+                return _json(200, job.as_dict())
+            if parts[2:] == ["image"]:
+                if job.status != "done":
+                    return _json(202 if job.status != "failed" else 500, job.as_dict())
+                with open(job.path, "rb") as f:
+                    return 200, "image/png", f.read()
+        return _json(404, {"error": f"no route for {method} {path}"})
+
+    async def serve_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            request_line = (await reader.readline()).decode("latin-1").split()
+            if len(request_line) < 2:
+                return
+            method, path = request_line[0], request_line[1]
+            length = 0
+            while (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+                name, _, value = line.decode("latin-1").partition(":")
+                if name.strip().lower() == "content-length":
+                    length = int(value)
+            body = await reader.readexactly(length) if length else b""
+
+            status, content_type, data = await self.handle(method, path, body)
+            writer.write(
+                f"HTTP/1.1 {status} {_REASONS.get(status, '')}\r\n"
+                f"Content-Type: {content_type}\r\nContent-Length: {len(data)}\r\nConnection: close\r\n\r\n".encode()
+                + data
+            )
+            await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+_REASONS = {200: "OK", 202: "Accepted", 400: "Bad Request", 404: "Not Found", 500: "Internal Server Error"}
+
+def _json(status: int, data: dict) -> Tuple[int, str, bytes]:
+    return status, "application/json", json.dumps(data).encode()
+
+async def serve(host: str = "127.0.0.1", port: int = 8000, workers: int = 2, cache_dir: str = ".render_cache",
+                ready: asyncio.Event = None) -> None:
+    service = RenderService(workers, cache_dir)
+    await service.start()
+    server = await asyncio.start_server(service.serve_connection, host, port)
+    if ready is not None:
+        ready.set()
+    asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, asyncio.current_task().cancel)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await service.stop()
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--cache-dir", default=".render_cache")
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(serve(args.host, args.port, args.workers, args.cache_dir))
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        pass
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
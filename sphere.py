@@ -6,33 +6,59 @@ from material import Material
 class Sphere(Hittable):
     def __init__(self, center: Point3, radius: float, mat: Material) -> None:
         super().__init__()
-        self.center = center
         self.radius = max(0.0, radius)
         self.mat = mat
+        self.move_to(center)
+    
+    def move_to(self, center: Point3) -> None:
+        """Moves the sphere; a `BVH` containing it needs a `refit` afterwards."""
+        self.center = center
+        rvec = Vec3(self.radius, self.radius, self.radius)
+        self.bbox = AABB.from_points(center - rvec, center + rvec)
+        
+    primitive = True
+    
+    def distance(self, r: Ray, t_min: float, t_max: float) -> float:
+        """Distance along `r` of the nearest hit with t_min < t < t_max, or `math.inf`."""
         
-    def hit(self, r: Ray, ray_t: Interval) -> HitRecord:
-        oc = self.center - r.orig
-        a = r.dir.mag_sq
-        h = r.dir.dot(oc)
-        c = oc.mag_sq - self.radius ** 2
+        # The terms of `oc = center - orig` on plain floats: no vector is built per object tested.
+        center, orig, d = self.center, r.orig, r.dir
+        ocx = center.x - orig.x; ocy = center.y - orig.y; ocz = center.z - orig.z
+        dx, dy, dz = d.x, d.y, d.z
+        a = dx*dx + dy*dy + dz*dz
+        h = dx*ocx + dy*ocy + dz*ocz
+        c = (ocx*ocx + ocy*ocy + ocz*ocz) - self.radius ** 2
         
         discriminant = h*h - a*c
     
-        if discriminant < 0: return None
+        if discriminant < 0: return math.inf
 
         sqrtd = math.sqrt(discriminant)
 
         # Find the nearest root that lies in the acceptable range.
         root = (h - sqrtd) / a
-        if not ray_t.surrounds(root):
+        if not t_min < root < t_max:
             root = (h + sqrtd) / a
-            if not ray_t.surrounds(root): return None
-
+            if not t_min < root < t_max: return math.inf
+        return root
+    
+    def closest(self, r: Ray, t_min: float, t_max: float) -> Tuple[float, Hittable]:
+        t = self.distance(r, t_min, t_max)
+        return None if t == math.inf else (t, self)
+    
+    def occluded(self, r: Ray, t_min: float, t_max: float) -> bool:
+        return self.distance(r, t_min, t_max) != math.inf
+    
+    def record(self, r: Ray, t: float, obj: Hittable = None) -> HitRecord:
         rec = HitRecord()
-        rec.t = root
-        rec.p = r.at(rec.t)
+        rec.t = t
+        rec.p = r.at(t)
         outward_normal = (rec.p - self.center) / self.radius
         rec.set_face_normal(r, outward_normal)
         rec.mat = self.mat
+        rec.obj = self
         
-        return rec
\ No newline at end of file
+        return rec
+    
+    def bounding_box(self) -> AABB:
+        return self.bbox
\ No newline at end of file
@@ -0,0 +1,91 @@
+"""
+Correctness tests of the render backends: the NumPy and Numba backends must
+converge to the same image as the Python path. The backends draw different
+random numbers, so images are compared by their statistics (mean color and
+the mean of every block of pixels), not pixel by pixel.
+
+    python -m unittest test_backends
+"""
+
+import unittest
+import numpy as np
+
+from scenes import *
+from bvh import BVH
+from compiled_scene import CompiledScene
+from framebuffer import Framebuffer
+import jit_backend
+
+WIDTH, SPP, DEPTH, SEED = 32, 16, 5, 7
+BLOCK = 8
+# In 0-255 units. Backends land within about 2 of each other; another scene is off by more than 8.
+MEAN_TOLERANCE = 2.0
+BLOCK_TOLERANCE = 4.0
+
+def render(backend: str, world: Hittable) -> np.ndarray:
+    cam = final_camera(WIDTH, SPP, DEPTH)
+    cam.backend = backend
+    cam.seed = SEED
+    cam.progress = False
+    framebuffer = Framebuffer(cam.image_width, cam.image_height)
+    cam.render(world, framebuffer)
+    return framebuffer.array.astype(np.float64)
+
+def block_means(image: np.ndarray) -> np.ndarray:
+    height, width = image.shape[0] // BLOCK * BLOCK, image.shape[1] // BLOCK * BLOCK
+    blocks = image[:height, :width].reshape(height // BLOCK, BLOCK, width // BLOCK, BLOCK, 3)
+    return blocks.mean(axis=(1, 3))
+
+class BackendTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.world = final_scene(SEED)
+        cls.scene = CompiledScene(cls.world)
+        cls.scene.build_bvh()
+        cls.reference = render("python", BVH(cls.world))
+
+    def assertSameImage(self, image: np.ndarray) -> None:
+        self.assertEqual(image.shape, self.reference.shape)
+        mean_error = np.abs(image.mean(axis=(0, 1)) - self.reference.mean(axis=(0, 1)))
+        self.assertLess(mean_error.max(), MEAN_TOLERANCE, f"mean color differs by {mean_error}")
+        block_error = np.sqrt(np.mean((block_means(image) - block_means(self.reference)) ** 2))
+        self.assertLess(block_error, BLOCK_TOLERANCE, f"block means differ by {block_error:.2f} RMS")
+
+    def test_numpy_matches_python(self) -> None:
+        self.assertSameImage(render("numpy", self.scene))
+
+    @unittest.skipUnless(jit_backend.available(), "numba is not installed")
+    def test_numba_matches_python(self) -> None:
+        self.assertSameImage(render("numba", self.scene))
+
+    def test_different_scene_is_detected(self) -> None:
+        # The statistics must be tight enough to tell a different scene apart.
+        other = render("numpy", CompiledScene(final_scene(SEED + 1)))
+        block_error = np.sqrt(np.mean((block_means(other) - block_means(self.reference)) ** 2))
+        self.assertGreater(block_error, BLOCK_TOLERANCE)
+
+class TraversalStackTest(unittest.TestCase):
+    def test_large_scene_fits(self) -> None:
+        scene = CompiledScene(scaled_scene(10000, SEED))
+        scene.build_bvh()
+        self.assertLessEqual(jit_backend.bvh_depth(scene) + 1, jit_backend.STACK_SIZE)
+
+    def test_too_deep_bvh_is_rejected(self) -> None:
+        # A chain of inner nodes, each with a leaf on one side, deeper than the stack.
+        scene = CompiledScene(few_spheres_scene())
+        depth = jit_backend.STACK_SIZE
+        nodes = [None] * (2 * depth - 1)
+        for i in range(depth - 1):
+            nodes[2 * i] = (2 * i + 2, 2 * i + 1, 0, 0, 0)
+            nodes[2 * i + 1] = (-1, -1, 0, 1, 0)
+        nodes[2 * depth - 2] = (-1, -1, 0, 1, 0)
+        scene.bvh_nodes = np.array(nodes, dtype=np.int32)
+        scene.bvh_bounds = np.zeros((len(nodes), 6))
+        scene.bvh_prims = np.zeros(1, dtype=np.int32)
+
+        self.assertEqual(jit_backend.bvh_depth(scene), depth)
+        with self.assertRaises(ValueError):
+            jit_backend.prepare(scene)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,283 @@
+import numpy as np
+
+from camera import *
+from compiled_scene import *
+from framebuffer import to_rgb8
+from denoise import MISS_DEPTH, luminance
+
+def _dot(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    return np.einsum('ij,ij->i', a, b)
+
+def _rand_unit_vectors(rng: np.random.Generator, n: int) -> np.ndarray:
+    # Same distribution as `Vec3.rand_unit_vector`, so both backends converge to the same image.
+    z = 1 - rng.random(n)
+    phi = 2 * math.pi * rng.random(n)
+    s = np.sqrt(1 - z * z)
+    return np.stack((np.cos(phi) * s, np.sin(phi) * s, z), axis=1)
+
+def _rand_in_unit_disk(rng: np.random.Generator, n: int) -> np.ndarray:
+    r = np.sqrt(rng.random(n))
+    phi = 2 * math.pi * rng.random(n)
+    return np.stack((r * np.cos(phi), r * np.sin(phi)), axis=1)
+
+def _reflect(v: np.ndarray, n: np.ndarray) -> np.ndarray:
+    return v - n * (2 * _dot(v, n))[:, None]
+
+def _refract(uv: np.ndarray, n: np.ndarray, etai_over_etat: np.ndarray) -> np.ndarray:
+    cos_theta = np.minimum(-_dot(uv, n), 1.0)
+    r_out_perp = (uv + n * cos_theta[:, None]) * etai_over_etat[:, None]
+    r_out_parallel = n * -np.sqrt(np.abs(1.0 - _dot(r_out_perp, r_out_perp)))[:, None]
+    return r_out_perp + r_out_parallel
+
+MATERIAL_NAMES = ("lambertian", "metal", "dielectric")
+
+class QueueStats:
+    """
+    Occupancy of the per-material shading queues `scatter` sorts hits into.
+    Assign an instance to `Camera.queue_stats` to collect it with the NumPy
+    backend. A run is a stretch of consecutive hits shaded by the same code:
+    in ray order a run ends at every change of material type, once queued
+    every non-empty queue is one run.
+    """
+
+    def __init__(self) -> None:
+        self.reset()
+
+    def reset(self) -> None:
+        self.wavefronts = 0
+        self.shaded = 0
+        self.queued = [0] * len(MATERIAL_NAMES)
+        self.launches = [0] * len(MATERIAL_NAMES)
+        self.runs_unsorted = 0
+
+    def add(self, mat: np.ndarray, queues) -> None:
+        self.wavefronts += 1
+        self.shaded += len(mat)
+        self.runs_unsorted += int(np.count_nonzero(mat[1:] != mat[:-1])) + 1
+        for code, q in enumerate(queues):
+            self.queued[code] += len(q)
+            self.launches[code] += len(q) > 0
+
+    def as_dict(self) -> dict:
+        queues = {}
+        for code, name in enumerate(MATERIAL_NAMES):
+            queued, launches = self.queued[code], self.launches[code]
+            queues[name] = {
+                "queued": queued,
+                "launches": launches,
+                "mean_queue": queued / launches if launches else 0.0,
+                "occupancy": queued / self.shaded if self.shaded else 0.0,
+            }
+        runs_sorted = sum(self.launches)
+        return {
+            "wavefronts": self.wavefronts,
+            "shaded": self.shaded,
+            "mean_wavefront": self.shaded / self.wavefronts if self.wavefronts else 0.0,
+            "queues": queues,
+            "mean_run_unsorted": self.shaded / self.runs_unsorted if self.runs_unsorted else 0.0,
+            "mean_run_sorted": self.shaded / runs_sorted if runs_sorted else 0.0,
+        }
+
+def shading_queues(mat: np.ndarray):
+    """Indices of the hits of each material type code, in ray order within each queue."""
+    order = np.argsort(mat, kind="stable")
+    bounds = np.cumsum(np.bincount(mat, minlength=len(MATERIAL_NAMES)))
+    return np.split(order, bounds[:-1])
+
+# Bulk counterparts of each `Material.scatter`, run once per queue on its hits only.
+# Each returns (attenuation, scattered direction, scattered mask or True).
+
+def _scatter_lambertian(scene: CompiledScene, rng: np.random.Generator, dir: np.ndarray,
+                        normal: np.ndarray, front_face: np.ndarray, mat_id: np.ndarray):
+    d = normal + _rand_unit_vectors(rng, len(normal))
+    near_zero = np.all(np.abs(d) < 1e-8, axis=1)
+    d[near_zero] = normal[near_zero]
+    return scene.albedo[mat_id], d, True
+
+def _scatter_metal(scene: CompiledScene, rng: np.random.Generator, dir: np.ndarray,
+                   normal: np.ndarray, front_face: np.ndarray, mat_id: np.ndarray):
+    d = _reflect(dir, normal) + _rand_unit_vectors(rng, len(normal)) * scene.fuzz[mat_id][:, None]
+    return scene.albedo[mat_id], d, _dot(d, normal) > 0
+
+def _scatter_dielectric(scene: CompiledScene, rng: np.random.Generator, dir: np.ndarray,
+                        normal: np.ndarray, front_face: np.ndarray, mat_id: np.ndarray):
+    ior = scene.ior[mat_id]
+    ri = np.where(front_face, 1.0 / ior, ior)
+    unit = dir / np.linalg.norm(dir, axis=1)[:, None]
+
+    cos_theta = np.minimum(-_dot(unit, normal), 1.0)
+    sin_theta = np.sqrt(1.0 - cos_theta * cos_theta)
+    r0 = ((1 - ri) / (1 + ri)) ** 2
+    reflectance = r0 + (1 - r0) * (1 - cos_theta) ** 5
+
+    reflect = (ri * sin_theta > 1.0) | (reflectance > rng.random(len(ri)))
+    return 1.0, np.where(reflect[:, None], _reflect(unit, normal), _refract(unit, normal, ri)), True
+
+SCATTER_KERNELS = (_scatter_lambertian, _scatter_metal, _scatter_dielectric)
+
+def scatter(scene: CompiledScene, rng: np.random.Generator, dir: np.ndarray, p: np.ndarray,
+            normal: np.ndarray, front_face: np.ndarray, idx: np.ndarray, stats: QueueStats = None):
+    """
+    Batched counterpart of `Material.scatter` for a set of hit rays.
+    The hits are sorted into one queue per material type and every queue is
+    shaded in one pass of its kernel, diffuse first, then metal, then glass.
+    Returns (attenuation, scattered direction, scattered mask).
+    """
+
+    mat_id = scene.material[idx]
+    mat = scene.mat_type[mat_id]
+    attenuation = np.empty_like(dir)
+    new_dir = np.empty_like(dir)
+    scattered = np.empty(len(idx), dtype=bool)
+
+    queues = shading_queues(mat)
+    for kernel, q in zip(SCATTER_KERNELS, queues):
+        if len(q) == 0:
+            continue
+        attenuation[q], new_dir[q], scattered[q] = kernel(scene, rng, dir[q], normal[q], front_face[q], mat_id[q])
+
+    if stats is not None:
+        stats.add(mat, queues)
+    return attenuation, new_dir, scattered
+
+def trace(scene: CompiledScene, rng: np.random.Generator, orig: np.ndarray, dir: np.ndarray, max_depth: int,
+          first_hit: tuple = None, queue_stats: QueueStats = None, rr_min_depth: int = None,
+          depth_histogram: np.ndarray = None) -> np.ndarray:
+    """
+    Iterative, masked equivalent of `Camera.__ray_color` for a batch of rays,
+    including its Russian roulette from bounce `rr_min_depth` on.
+    With `first_hit`, an (albedo, normal, depth) tuple of arrays, the first
+    intersection of every ray is recorded into them, as `AOVBuffers.record` does.
+    With `queue_stats`, the occupancy of every bounce's shading queues is added to it.
+    With `depth_histogram`, every path is counted at the number of segments it traced.
+    """
+
+    n = len(orig)
+    color = np.zeros((n, 3))
+    throughput = np.ones((n, 3))
+    alive = np.arange(n)
+    orig = orig.copy()
+    dir = dir.copy()
+
+    for bounce in range(max_depth):
+        if len(alive) == 0:
+            break
+        paths = len(alive)
+
+        t, idx = scene.hit_batch(orig, dir, 0.001, math.inf)
+
+        miss = idx < 0
+        if miss.any():
+            unit = dir[miss] / np.linalg.norm(dir[miss], axis=1)[:, None]
+            a = ((unit[:, 1] + 1.0) * 0.5)[:, None]
+            sky = (1.0 - a) + np.array([0.5, 0.7, 1.0]) * a
+            color[alive[miss]] = throughput[miss] * sky
+            if first_hit is not None and bounce == 0:
+                first_hit[0][miss] = sky
+                first_hit[1][miss] = 0.0
+                first_hit[2][miss] = MISS_DEPTH
+
+        hit = ~miss
+        alive, orig, dir, throughput, t, idx = alive[hit], orig[hit], dir[hit], throughput[hit], t[hit], idx[hit]
+
+        p = orig + dir * t[:, None]
+        outward = (p - scene.centers[idx]) / scene.radii[idx][:, None]
+        front_face = _dot(dir, outward) < 0
+        normal = np.where(front_face[:, None], outward, -outward)
+        if first_hit is not None and bounce == 0:
+            first_hit[0][hit] = scene.albedo[scene.material[idx]]
+            first_hit[1][hit] = normal
+            first_hit[2][hit] = t * np.linalg.norm(dir, axis=1)
+
+        attenuation, new_dir, scattered = scatter(scene, rng, dir, p, normal, front_face, idx, queue_stats)
+
+        alive = alive[scattered]
+        orig = p[scattered]
+        dir = new_dir[scattered]
+        throughput = throughput[scattered] * attenuation[scattered]
+
+        # Russian roulette: survivors are reweighted by 1/p, which keeps the estimate unbiased.
+        if rr_min_depth is not None and bounce + 1 >= rr_min_depth:
+            p = np.minimum(throughput.max(axis=1), 0.95)
+            survive = rng.random(len(p)) < p
+            alive, orig, dir = alive[survive], orig[survive], dir[survive]
+            throughput = throughput[survive] / p[survive][:, None]
+
+        if depth_histogram is not None:
+            depth_histogram[bounce + 1] += paths - len(alive)
+
+    if depth_histogram is not None:
+        depth_histogram[max_depth] += len(alive)
+    return color
+
+def primary_rays(cam: Camera, rng: np.random.Generator, u: np.ndarray, v: np.ndarray):
+    """Batched counterpart of `Camera.__get_ray`. `cam.initialize()` must have been called."""
+
+    n = len(u)
+    offset = rng.random((n, 2)) - 0.5
+    pixel00 = np.array(tuple(cam.pixel00_loc))
+    delta_u = np.array(tuple(cam.pixel_delta_u))
+    delta_v = np.array(tuple(cam.pixel_delta_v))
+    pixel_sample = pixel00 + delta_u * (u + offset[:, 0])[:, None] + delta_v * (v + offset[:, 1])[:, None]
+
+    center = np.array(tuple(cam.center))
+    if cam.defocus_angle <= 0:
+        orig = np.broadcast_to(center, (n, 3)).copy()
+    else:
+        disk = _rand_in_unit_disk(rng, n)
+        orig = center + np.array(tuple(cam.defocus_disk_u)) * disk[:, :1] + np.array(tuple(cam.defocus_disk_v)) * disk[:, 1:]
+
+    return orig, pixel_sample - orig
+
+def render_linear(cam: Camera, world: Hittable, seed: int = None, batch_size: int = 8192, progress: bool = True) -> np.ndarray:
+    """Renders `world` and returns the averaged linear color as a (height, width, 3) float array."""
+
+    cam.initialize()
+    scene = world if isinstance(world, CompiledScene) else CompiledScene(world)
+    rng = np.random.default_rng(seed)
+
+    height, width = cam.image_height, cam.image_width
+    v, u = np.divmod(np.arange(height * width), width)
+    accum = np.zeros((height * width, 3))
+
+    aovs = cam.aovs
+    if aovs is not None:
+        aov_accum = (np.zeros((height * width, 3)), np.zeros((height * width, 3)), np.zeros(height * width))
+        lum_sq = np.zeros(height * width)
+
+    histogram = np.zeros(cam.max_depth + 1, dtype=np.int64)
+    options = dict(queue_stats=cam.queue_stats, rr_min_depth=cam.rr_min_depth, depth_histogram=histogram)
+
+    pbar = progress_bar(cam.samples_per_pixel * height * width, progress)
+    for _ in range(cam.samples_per_pixel):
+        for start in range(0, len(u), batch_size):
+            end = start + batch_size
+            orig, dir = primary_rays(cam, rng, u[start:end], v[start:end])
+            if aovs is None:
+                accum[start:end] += trace(scene, rng, orig, dir, cam.max_depth, **options)
+            else:
+                n = len(orig)
+                first_hit = (np.empty((n, 3)), np.empty((n, 3)), np.empty(n))
+                color = trace(scene, rng, orig, dir, cam.max_depth, first_hit, **options)
+                accum[start:end] += color
+                lum_sq[start:end] += luminance(color) ** 2
+                for total, value in zip(aov_accum, first_hit):
+                    total[start:end] += value
+            pbar.update(len(orig))
+    pbar.close()
+    cam.depth_histogram = histogram.tolist()
+
+    spp = cam.samples_per_pixel
+    linear = (accum / spp).reshape(height, width, 3)
+    if aovs is not None:
+        albedo, normal, depth = (a / spp for a in aov_accum)
+        aovs.set(linear, albedo.reshape(height, width, 3), normal.reshape(height, width, 3),
+                 depth.reshape(height, width), lum_sq.reshape(height, width) / spp, spp)
+    return linear
+
+def render(cam: Camera, world: Hittable, target, seed: int = None, batch_size: int = 8192) -> None:
+    """Drop-in replacement for `Camera.render` that traces rays in NumPy batches."""
+
+    image = to_rgb8(render_linear(cam, world, seed, batch_size, cam.progress))
+    for v, row in enumerate(image):
+        write_row(target, v, row.ravel().tolist())